@@ -0,0 +1,87 @@
+import asyncio
+import collections
+import enum
+from typing import Deque, Optional, Tuple
+from MemoryManager import MemoryManager
+
+
+class WaitPolicy(enum.Enum):
+    FIFO = 0  # Waiters are served strictly in arrival order; a large waiter holds back later ones
+    SIZE_AWARE = 1  # Any waiter that fits is served, in arrival order among those that fit
+
+
+class AsyncMemoryManager:
+    # An asyncio front-end for a MemoryManager. `await alloc(size)` suspends until the
+    # memory can be served instead of returning -1, which gives callers back-pressure without
+    # polling. Waiters sit in a queue that is re-checked after each release, only when the
+    # largest free block became large enough for one of them. All calls must come from the
+    # event loop's thread.
+
+    def __init__(self, memory_manager: MemoryManager, policy: WaitPolicy = WaitPolicy.FIFO) -> None:
+        self.memory_manager = memory_manager
+        self.policy = policy
+        self.waiters: Deque[Tuple[int, asyncio.Future]] = collections.deque()
+
+    def waiting(self) -> int:
+        return len(self.waiters)
+
+    async def alloc(self, size: int, timeout: Optional[float] = None) -> int:
+        # Returns the start address of the block. Returns -1 at once for a size that can never
+        # be served, and raises asyncio.TimeoutError after `timeout` seconds of waiting.
+        if size > self.memory_manager.total_memory or size <= 0:
+            return -1
+        if not self.waiters or self.policy == WaitPolicy.SIZE_AWARE:
+            # Under FIFO a newcomer must not overtake earlier waiters
+            start = self.memory_manager._request(size, None)
+            if start != -1:
+                return start
+        waiter = size, asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            if timeout is None:
+                return await waiter[1]
+            return await asyncio.wait_for(waiter[1], timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            future = waiter[1]
+            if future.done() and not future.cancelled():
+                # Served just before the cancellation arrived: give the block back
+                self.release(future.result(), size)
+            else:
+                future.cancel()
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+                self._serve_waiters()  # Under FIFO the waiters behind this one may fit now
+            raise
+
+    def release(self, addr: int, size: int) -> bool:
+        released = self.memory_manager._release(addr, size)
+        if released and self.waiters:
+            self._serve_waiters()
+        return released
+
+    def _serve_waiters(self) -> None:
+        largest_free_block = self.memory_manager.stats()["largest_free_block"]
+        if self.policy == WaitPolicy.FIFO:
+            while self.waiters:
+                size, future = self.waiters[0]
+                if not future.done():
+                    if size > largest_free_block:
+                        break
+                    start = self.memory_manager._request(size, None)
+                    if start == -1:
+                        break
+                    future.set_result(start)
+                    largest_free_block = self.memory_manager.stats()["largest_free_block"]
+                self.waiters.popleft()
+            return
+        for waiter in list(self.waiters):
+            size, future = waiter
+            if not future.done():
+                if size > largest_free_block:
+                    continue
+                start = self.memory_manager._request(size, None)
+                if start == -1:
+                    continue
+                future.set_result(start)
+                largest_free_block = self.memory_manager.stats()["largest_free_block"]
+            self.waiters.remove(waiter)
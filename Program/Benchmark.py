@@ -0,0 +1,450 @@
+from GarbageCollector import CollectorPhase, GarbageCollector, GenerationalCollector, IncrementalCollector
+from HashTable import BST, AVLTree, FreeAddressIndex, TwoLevelHashTable, TwoLevelHashTableList, TreeBackend
+from MemoryManager import MemoryManager, MemoryStrategy
+from MemoryOperation import MemoryOperation, MemoryOperationType
+from ShardedMemoryManager import ShardedMemoryManager, ShardingPolicy
+import random
+import threading
+import time
+import tracemalloc
+
+
+class RecursiveBST:
+    # The original recursive second-level tree, kept only as a benchmark reference
+    class Node:
+        def __init__(self, key, value):
+            self.key = key
+            self.value = value
+            self.left = None
+            self.right = None
+
+    def __init__(self):
+        self.root = None
+
+    def _insert(self, node, key, value):
+        if node is None:
+            return self.Node(key, value)
+        if key < node.key:
+            node.left = self._insert(node.left, key, value)
+        elif key > node.key:
+            node.right = self._insert(node.right, key, value)
+        else:
+            node.value = value
+        return node
+
+    def insert(self, key, value):
+        self.root = self._insert(self.root, key, value)
+
+    def _query(self, node, key):
+        if node is None:
+            return None
+        if key < node.key:
+            return self._query(node.left, key)
+        elif key > node.key:
+            return self._query(node.right, key)
+        return node.value
+
+    def query(self, key):
+        return self._query(self.root, key)
+
+    def _delete(self, node, key):
+        if node is None:
+            return None
+        if key < node.key:
+            node.left = self._delete(node.left, key)
+        elif key > node.key:
+            node.right = self._delete(node.right, key)
+        else:
+            if node.left is None:
+                return node.right
+            if node.right is None:
+                return node.left
+            min_larger_node = node.right
+            while min_larger_node.left is not None:
+                min_larger_node = min_larger_node.left
+            node.key, node.value = min_larger_node.key, min_larger_node.value
+            node.right = self._delete(node.right, min_larger_node.key)
+        return node
+
+    def delete(self, key):
+        if self.query(key) is None:
+            return False
+        self.root = self._delete(self.root, key)
+        return True
+
+    def _inorder_traversal(self, node):
+        if node is None:
+            return []
+        return self._inorder_traversal(node.left) + [(node.key, node.value)] + self._inorder_traversal(node.right)
+
+    def items(self):
+        return self._inorder_traversal(self.root)
+
+
+def time_per_operation(function, keys):
+    start_time = time.perf_counter()
+    for key in keys:
+        function(key)
+    return (time.perf_counter() - start_time) / len(keys)
+
+
+def benchmark_sequential_trace(backend, n, bits=30):
+    # With a large address space all sequential addresses land in bucket 0,
+    # so the cost is dominated by the shape of a single second-level tree.
+    hash_table = TwoLevelHashTable(bits, backend)
+    keys = list(range(n))
+    results = {"insert": time_per_operation(lambda key: hash_table.insert(key, 1), keys),
+               "query": time_per_operation(hash_table.query, keys),
+               "find_successor": time_per_operation(hash_table.next_larger_key, keys),
+               "delete": time_per_operation(hash_table.delete, keys)}
+    return results
+
+
+def benchmark_tree_backends():
+    print("Sequential-address trace, microseconds per operation")
+    print(f"{'backend':>8} {'n':>7} {'insert':>9} {'query':>9} {'successor':>10} {'delete':>9}")
+    # The plain BST degenerates into a list, so each operation is linear in n. Its engine is
+    # iterative and runs past the old recursion limit; it stops at 6400 keys only to keep the run short.
+    sizes = {TreeBackend.BST: [100, 200, 400, 800, 3200, 6400],
+             TreeBackend.AVL: [100, 200, 400, 800, 3200, 12800, 51200],
+             TreeBackend.COMPACT: [100, 200, 400, 800, 3200, 12800, 51200]}
+    for backend, backend_sizes in sizes.items():
+        for n in backend_sizes:
+            results = benchmark_sequential_trace(backend, n)
+            print(f"{backend.name:>8} {n:>7} {results['insert'] * 1e6:>9.2f} {results['query'] * 1e6:>9.2f} "
+                  f"{results['find_successor'] * 1e6:>10.2f} {results['delete'] * 1e6:>9.2f}")
+
+
+def benchmark_memory_per_block(n=200000, bits=40):
+    # Traced bytes per entry for each table and backend, with random keys so every backend builds the same trees.
+    # Below 32 bits the compact pools use 32-bit columns, so run it with bits=31 as well.
+    print(f"Memory per tracked block in a 2^{bits} byte address space, bytes")
+    print(f"{'backend':>8} {'allocated':>10} {'free sizes':>11} {'free addresses':>15}")
+    keys = random.Random(0).sample(range(2 ** bits), n)
+    rows = {}
+    for backend in TreeBackend:
+        row = []
+        for make_table in [lambda: TwoLevelHashTable(bits, backend), lambda: TwoLevelHashTableList(bits, backend),
+                           lambda: FreeAddressIndex(bits, None, backend)]:
+            tracemalloc.start()
+            table = make_table()
+            base = tracemalloc.get_traced_memory()[0]
+            for key in keys:
+                table.insert(key, key >> 3)
+            row.append((tracemalloc.get_traced_memory()[0] - base) / n)
+            tracemalloc.stop()
+        print(f"{backend.name:>8} {row[0]:>10.1f} {row[1]:>11.1f} {row[2]:>15.1f}")
+        rows[backend] = row
+    # Savings of the compact pools over the slotted AVL nodes they replace
+    ratios = [avl / compact for avl, compact in zip(rows[TreeBackend.AVL], rows[TreeBackend.COMPACT])]
+    print(f"{'saving':>8} {ratios[0]:>9.1f}x {ratios[1]:>10.1f}x {ratios[2]:>14.1f}x")
+
+
+def operations_per_second(tree_class, keys):
+    tree = tree_class()
+    start_time = time.perf_counter()
+    for key in keys:
+        tree.insert(key, key)
+    for key in keys:
+        tree.query(key)
+    tree.items()
+    for key in keys:
+        tree.delete(key)
+    return (3 * len(keys) + 1) / (time.perf_counter() - start_time)
+
+
+def benchmark_iterative_engine(n=20000, sequential_n=800):
+    print("Second-level tree engines, operations per second")
+    random_keys = random.Random(0).sample(range(n * 16), n)
+    sequential_keys = list(range(sequential_n))
+    print(f"{'engine':>14} {'random':>12} {'sequential':>12}")
+    for name, tree_class in [("recursive BST", RecursiveBST), ("iterative BST", BST), ("iterative AVL", AVLTree)]:
+        print(f"{name:>14} {operations_per_second(tree_class, random_keys):>12.0f} "
+              f"{operations_per_second(tree_class, sequential_keys):>12.0f}")
+    # A sequential trace beyond the recursion limit only completes with the iterative engine
+    for name, tree_class in [("recursive BST", RecursiveBST), ("iterative BST", BST)]:
+        try:
+            tree = tree_class()
+            for key in range(5000):
+                tree.insert(key, key)
+            tree.items()
+            print(f"{name}: 5000 sequential keys ok")
+        except RecursionError:
+            print(f"{name}: RecursionError on 5000 sequential keys")
+
+
+def benchmark_scaling(strategy=MemoryStrategy.BEST_FIT, churn_operations=2000):
+    print(f"Scaling with arena size and live blocks ({strategy.name}), microseconds per operation")
+    print(f"{'arena':>14} {'buckets':>8} {'live':>7} {'request':>9} {'release':>9}")
+    for arena_bits in [10, 20, 30, 40]:
+        arena_size = 2 ** arena_bits
+        for live_blocks in [100, 1000, 10000]:
+            if arena_size < 4 * live_blocks:
+                continue
+            rng = random.Random(arena_bits * live_blocks)
+            max_block_size = arena_size // (2 * live_blocks)
+            memory_manager = MemoryManager(strategy, total_memory=arena_size)
+            live = []
+            for _ in range(live_blocks):
+                size = rng.randint(1, max_block_size)
+                address = memory_manager.request(MemoryOperation(MemoryOperationType.REQUEST, size=size))
+                live.append((address, size))
+            request_time = release_time = 0.0
+            for _ in range(churn_operations):
+                address, size = live.pop(rng.randrange(len(live)))
+                start_time = time.perf_counter()
+                memory_manager.release(MemoryOperation(MemoryOperationType.RELEASE, addr=address, size=size))
+                release_time += time.perf_counter() - start_time
+                size = rng.randint(1, max_block_size)
+                start_time = time.perf_counter()
+                address = memory_manager.request(MemoryOperation(MemoryOperationType.REQUEST, size=size))
+                request_time += time.perf_counter() - start_time
+                live.append((address, size))
+            print(f"{'2^' + str(arena_bits):>14} {memory_manager.free_addresses_hash_table.capacity:>8} {live_blocks:>7} "
+                  f"{request_time / churn_operations * 1e6:>9.2f} {release_time / churn_operations * 1e6:>9.2f}")
+
+
+def benchmark_sparse_neighbour_lookup(bits=48, first_level_bits=16, n=2000):
+    # Two keys at opposite ends of a 2 ** 16 bucket table: every neighbour lookup crosses empty buckets
+    print("Neighbour lookups across empty buckets, microseconds per operation")
+    hash_table = TwoLevelHashTable(bits, TreeBackend.AVL, first_level_bits)
+    hash_table.insert(0, 0)
+    hash_table.insert(2 ** bits - 1, 0)
+    keys = [2 ** (bits - 1)] * n
+    print(f"next_larger_key {time_per_operation(hash_table.next_larger_key, keys) * 1e6:.2f}, "
+          f"next_smaller_key {time_per_operation(hash_table.next_smaller_key, keys) * 1e6:.2f}, "
+          f"max_key {time_per_operation(lambda key: hash_table.max_key(), keys) * 1e6:.2f}")
+
+
+def benchmark_request_latency(arena_size=2 ** 24, live_blocks=5000, churn_operations=20000):
+    # Tail latency matters more than the mean for real-time callers
+    print("Request latency under churn, microseconds")
+    print(f"{'strategy':>10} {'mean':>8} {'p99':>8} {'max':>8}")
+    for strategy in MemoryStrategy:
+        rng = random.Random(0)
+        memory_manager = MemoryManager(strategy, total_memory=arena_size)
+        max_block_size = arena_size // (2 * live_blocks)
+        live = []
+        for _ in range(live_blocks):
+            size = rng.randint(1, max_block_size)
+            live.append((memory_manager.request(MemoryOperation(MemoryOperationType.REQUEST, size=size)), size))
+        latencies = []
+        for _ in range(churn_operations):
+            address, size = live.pop(rng.randrange(len(live)))
+            memory_manager.release(MemoryOperation(MemoryOperationType.RELEASE, addr=address, size=size))
+            size = rng.randint(1, max_block_size)
+            start_time = time.perf_counter()
+            address = memory_manager.request(MemoryOperation(MemoryOperationType.REQUEST, size=size))
+            latencies.append(time.perf_counter() - start_time)
+            live.append((address, size))
+        latencies.sort()
+        print(f"{strategy.name:>10} {sum(latencies) / len(latencies) * 1e6:>8.2f} "
+              f"{latencies[int(len(latencies) * 0.99)] * 1e6:>8.2f} {latencies[-1] * 1e6:>8.2f}")
+
+
+def benchmark_strategy_comparison(arena_size=2 ** 20, operations=20000, max_block_size=2000):
+    # Same random request/release decisions for every strategy
+    print("Strategy comparison on a random trace")
+    print(f"{'strategy':>10} {'ops/sec':>10} {'failed':>7} {'peak internal fragmentation':>28}")
+    for strategy in MemoryStrategy:
+        rng = random.Random(0)
+        memory_manager = MemoryManager(strategy, total_memory=arena_size)
+        live = []
+        failed = peak_internal_fragmentation = 0
+        start_time = time.perf_counter()
+        for _ in range(operations):
+            if live and rng.random() < 0.45:
+                address, size = live.pop(rng.randrange(len(live)))
+                memory_manager.release(MemoryOperation(MemoryOperationType.RELEASE, addr=address, size=size))
+            else:
+                size = rng.randint(1, max_block_size)
+                address = memory_manager.request(MemoryOperation(MemoryOperationType.REQUEST, size=size))
+                if address == -1:
+                    failed += 1
+                else:
+                    live.append((address, size))
+                    peak_internal_fragmentation = max(peak_internal_fragmentation, memory_manager.internal_fragmentation())
+        elapsed = time.perf_counter() - start_time
+        print(f"{strategy.name:>10} {operations / elapsed:>10.0f} {failed:>7} {peak_internal_fragmentation:>28}")
+
+
+def benchmark_batch_api(arena_size=2 ** 24, n=50000, max_block_size=64):
+    # Back-to-back allocations released in random order, one call per block versus one batch
+    print("Batch API versus single operations, seconds")
+    rng = random.Random(0)
+    sizes = [rng.randint(1, max_block_size) for _ in range(n)]
+    release_order = list(range(n))
+    rng.shuffle(release_order)
+
+    memory_manager = MemoryManager(MemoryStrategy.FIRST_FIT, total_memory=arena_size)
+    start_time = time.perf_counter()
+    addresses = [memory_manager.request(MemoryOperation(MemoryOperationType.REQUEST, size=size)) for size in sizes]
+    request_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    for index in release_order:
+        memory_manager.release(MemoryOperation(MemoryOperationType.RELEASE, addr=addresses[index], size=sizes[index]))
+    release_time = time.perf_counter() - start_time
+    print(f"single: request {request_time:.3f}, release {release_time:.3f}")
+
+    memory_manager = MemoryManager(MemoryStrategy.FIRST_FIT, total_memory=arena_size)
+    start_time = time.perf_counter()
+    addresses = memory_manager.request_many(sizes)
+    request_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    memory_manager.release_many(addresses[release_order], [sizes[index] for index in release_order])
+    release_time = time.perf_counter() - start_time
+    print(f"batch:  request {request_time:.3f}, release {release_time:.3f}")
+
+
+class GloballyLockedMemoryManager:
+    # One MemoryManager behind one lock, the baseline the sharded manager replaces
+    def __init__(self, strategy, total_memory):
+        self.memory_manager = MemoryManager(strategy, total_memory=total_memory)
+        self.lock = threading.Lock()
+
+    def _request(self, size, addr):
+        with self.lock:
+            return self.memory_manager._request(size, addr)
+
+    def _release(self, addr, size):
+        with self.lock:
+            return self.memory_manager._release(addr, size)
+
+
+def threaded_churn(memory_manager, threads, operations_per_thread, max_block_size):
+    # Every thread keeps its own live blocks and randomly requests and releases them
+    def worker(seed):
+        rng = random.Random(seed)
+        live = []
+        for _ in range(operations_per_thread):
+            if live and rng.random() < 0.45:
+                address, size = live.pop(rng.randrange(len(live)))
+                memory_manager._release(address, size)
+            else:
+                size = rng.randint(1, max_block_size)
+                address = memory_manager._request(size, None)
+                if address != -1:
+                    live.append((address, size))
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    start_time = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return threads * operations_per_thread / (time.perf_counter() - start_time)
+
+
+def benchmark_sharded_contention(strategy=MemoryStrategy.FIRST_FIT, arena_size=2 ** 24, operations_per_thread=5000,
+                                 max_block_size=256):
+    # Aggregate throughput as threads are added. Under the GIL the gain comes from threads no
+    # longer queueing on one lock; without it the arenas also run in parallel.
+    print(f"Multi-threaded churn ({strategy.name}), operations per second")
+    print(f"{'threads':>7} {'global lock':>12} {'thread arenas':>14} {'size-class arenas':>18}")
+    for threads in [1, 2, 4, 8, 16]:
+        global_lock = threaded_churn(GloballyLockedMemoryManager(strategy, arena_size), threads,
+                                     operations_per_thread, max_block_size)
+        thread_arenas = threaded_churn(ShardedMemoryManager(strategy, arena_size, arenas=8, policy=ShardingPolicy.THREAD),
+                                       threads, operations_per_thread, max_block_size)
+        size_class_arenas = threaded_churn(ShardedMemoryManager(strategy, arena_size, arenas=8,
+                                                                policy=ShardingPolicy.SIZE_CLASS,
+                                                                max_request_size=max_block_size),
+                                           threads, operations_per_thread, max_block_size)
+        print(f"{threads:>7} {global_lock:>12.0f} {thread_arenas:>14.0f} {size_class_arenas:>18.0f}")
+
+
+def high_churn_trace(rng, n, max_block_size, mean_lifetime, long_lived_fraction):
+    # (size, lifetime in allocations) per allocation; most blocks die young, a few never do
+    return [(rng.randint(1, max_block_size),
+             None if rng.random() < long_lived_fraction else int(rng.expovariate(1 / mean_lifetime)) + 1)
+            for _ in range(n)]
+
+
+def replay_high_churn(trace, allocate, kill):
+    # Allocate in order and kill each block when its lifetime runs out. Returns the failed allocations.
+    deaths = {}
+    failed = 0
+    for step, (size, lifetime) in enumerate(trace):
+        handle = allocate(size)
+        if handle == -1:
+            failed += 1
+        elif lifetime is not None:
+            deaths.setdefault(step + lifetime, []).append(handle)
+        for handle in deaths.pop(step, ()):
+            kill(handle)
+    return failed
+
+
+def benchmark_generational(arena_size=2 ** 22, n=20000, max_block_size=64, mean_lifetime=20,
+                           long_lived_fraction=0.02, nursery_size=2 ** 14):
+    # Explicit alloc/free with every strategy versus the generational collector, where a block
+    # dies by dropping its root and is reclaimed by minor collections
+    print("High-churn trace, allocations per second")
+    print(f"{'strategy':>10} {'explicit free':>14} {'generational':>13} {'minor collections':>18} "
+          f"{'p99 minor pause ms':>19}")
+    trace = high_churn_trace(random.Random(0), n, max_block_size, mean_lifetime, long_lived_fraction)
+    for strategy in MemoryStrategy:
+        memory_manager = MemoryManager(strategy, total_memory=arena_size)
+        start_time = time.perf_counter()
+        replay_high_churn(trace, memory_manager.alloc, memory_manager.free)
+        explicit = n / (time.perf_counter() - start_time)
+
+        collector = GenerationalCollector(MemoryManager(strategy, total_memory=arena_size), nursery_size)
+
+        def allocate(size):
+            handle = collector.allocate(size)
+            if handle != -1:
+                collector.add_root(handle)
+            return handle
+
+        start_time = time.perf_counter()
+        replay_high_churn(trace, allocate, collector.remove_root)
+        generational = n / (time.perf_counter() - start_time)
+        pauses = sorted(collector.minor_pause_times) or [0.0]
+        p99 = pauses[min(len(pauses) - 1, int(len(pauses) * 0.99))] * 1000
+        print(f"{strategy.name:>10} {explicit:>14.0f} {generational:>13.0f} {len(collector.minor_pause_times):>18} "
+              f"{p99:>19.3f}")
+
+
+def build_heap(collector, rng, n, max_block_size, references_per_block=2, root_fraction=0.01):
+    # A random object graph; blocks not reachable from the sampled roots are garbage
+    handles = [collector.allocate(rng.randint(1, max_block_size)) for _ in range(n)]
+    for handle in handles:
+        for _ in range(references_per_block):
+            collector.add_reference(handle, rng.choice(handles))
+        if rng.random() < root_fraction:
+            collector.add_root(handle)
+
+
+def benchmark_incremental_pauses(arena_size=2 ** 24, n=20000, max_block_size=64):
+    # Pause of one stop-the-world collection versus the step pauses of incremental cycles
+    print("Collection pauses on the same heap, milliseconds")
+    print(f"{'collector':>22} {'steps':>6} {'p50':>8} {'p99':>8} {'max':>8}")
+    collector = GarbageCollector(MemoryManager(MemoryStrategy.FIRST_FIT, total_memory=arena_size))
+    build_heap(collector, random.Random(0), n, max_block_size)
+    pause = collector.collect()["pause_seconds"] * 1000
+    print(f"{'stop-the-world':>22} {1:>6} {pause:>8.3f} {pause:>8.3f} {pause:>8.3f}")
+    for budget in [{"max_objects": 64}, {"max_objects": 512}, {"max_micros": 200}, {"max_micros": 1000}]:
+        collector = IncrementalCollector(MemoryManager(MemoryStrategy.FIRST_FIT, total_memory=arena_size))
+        build_heap(collector, random.Random(0), n, max_block_size)
+        collector.collect_step(**budget)
+        while collector.phase != CollectorPhase.IDLE:
+            collector.collect_step(**budget)
+        name, value = next(iter(budget.items()))
+        print(f"{f'{name}={value}':>22} {len(collector.step_pause_times):>6} {collector.pause_percentile(0.5) * 1000:>8.3f} "
+              f"{collector.pause_percentile(0.99) * 1000:>8.3f} {max(collector.step_pause_times) * 1000:>8.3f}")
+
+
+if __name__ == "__main__":
+    benchmark_tree_backends()
+    benchmark_iterative_engine()
+    benchmark_memory_per_block(bits=31)
+    benchmark_memory_per_block(bits=40)
+    benchmark_scaling()
+    benchmark_sparse_neighbour_lookup()
+    benchmark_request_latency()
+    benchmark_strategy_comparison()
+    benchmark_batch_api()
+    benchmark_sharded_contention()
+    benchmark_generational()
+    benchmark_incremental_pauses()
@@ -0,0 +1,78 @@
+from MemoryManager import MemoryManager, MemoryStrategy
+from MemoryOperation import MemoryOperation, MemoryOperationType
+from Workload import standard_workloads
+import argparse
+import json
+import time
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run_workload(strategy, arena_size, workload, sample_every=64):
+    # Replay one workload and return throughput, latency percentiles and peak fragmentation
+    memory_manager = MemoryManager(strategy, total_memory=arena_size)
+    addresses = []  # Start address and size per request id, None if the request failed
+    latencies = []
+    failed_requests = 0
+    peak_fragmentation = 0.0
+    for operation in workload():
+        if operation[0] == 1:
+            _, size, addr = operation
+            op = MemoryOperation(MemoryOperationType.REQUEST, addr=addr, size=size)
+            start_time = time.perf_counter_ns()
+            address = memory_manager.request(op)
+            latencies.append(time.perf_counter_ns() - start_time)
+            if address == -1:
+                failed_requests += 1
+                addresses.append(None)
+            else:
+                addresses.append((address, size))
+        else:
+            block = addresses[operation[1]]
+            if block is None:
+                continue
+            op = MemoryOperation(MemoryOperationType.RELEASE, addr=block[0], size=block[1])
+            start_time = time.perf_counter_ns()
+            memory_manager.release(op)
+            latencies.append(time.perf_counter_ns() - start_time)
+        if len(latencies) % sample_every == 0:
+            peak_fragmentation = max(peak_fragmentation, memory_manager.stats()["external_fragmentation"])
+    total_time = sum(latencies) / 1e9
+    latencies.sort()
+    return {
+        "operations": len(latencies),
+        "failed_requests": failed_requests,
+        "ops_per_sec": len(latencies) / total_time if total_time > 0 else 0.0,
+        "p50_us": percentile(latencies, 0.50) / 1e3,
+        "p99_us": percentile(latencies, 0.99) / 1e3,
+        "peak_fragmentation": peak_fragmentation,
+    }
+
+
+def run_suite(arena_sizes, strategies=tuple(MemoryStrategy), seed=0, scale=2000):
+    results = []
+    for arena_size in arena_sizes:
+        for workload_name, workload in standard_workloads(arena_size, seed, scale):
+            for strategy in strategies:
+                result = {"workload": workload_name, "strategy": strategy.name, "arena_size": arena_size}
+                result.update(run_workload(strategy, arena_size, workload))
+                print(f"{workload_name:>20} {strategy.name:>10} 2^{arena_size.bit_length() - 1:<3} "
+                      f"{result['ops_per_sec']:>9.0f} ops/s  p99 {result['p99_us']:>8.1f} us  "
+                      f"peak fragmentation {result['peak_fragmentation']:.3f}")
+                results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run every strategy on the synthetic workloads and report JSON.")
+    parser.add_argument("--arena-bits", type=int, nargs="+", default=[16, 20, 24])
+    parser.add_argument("--scale", type=int, default=2000, help="Blocks per workload")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    arguments = parser.parse_args()
+    suite_results = run_suite([2 ** bits for bits in arguments.arena_bits], seed=arguments.seed, scale=arguments.scale)
+    with open(arguments.output, mode="w") as output_file:
+        json.dump(suite_results, output_file, indent=2)
+    print(f"Wrote {len(suite_results)} results to {arguments.output}.")
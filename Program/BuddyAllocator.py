@@ -0,0 +1,114 @@
+from typing import Dict, List, Optional, Tuple
+
+
+class BuddyAllocator:
+    # Binary buddy system. Requests are rounded up to a power of two ("order"), free blocks
+    # of each order sit in their own free list, and a bitmap marks the orders whose list is
+    # non-empty. A block's buddy is found by flipping one address bit (start ^ 2 ** order),
+    # so splitting and coalescing cost O(log M) arithmetic steps and no tree searches.
+
+    def __init__(self, total_memory: int):
+        self.total_memory = total_memory
+        self.max_order = total_memory.bit_length() - 1
+        # One dict per order used as an insertion-ordered set of free start addresses
+        self.free_lists: List[Dict[int, None]] = [{} for _ in range(self.max_order + 1)]
+        self.order_bitmap = 0
+        self.allocated_blocks: Dict[int, Tuple[int, int]] = {}  # start -> (order, requested size)
+        self.allocated_bytes = 0
+        self.requested_bytes = 0
+        # Seed the free lists with the largest aligned power-of-two blocks covering the arena
+        start = 0
+        while start < total_memory:
+            order = self.max_order
+            while start % (1 << order) or start + (1 << order) > total_memory:
+                order -= 1
+            self._push(start, order)
+            start += 1 << order
+
+    @staticmethod
+    def order_for(size: int) -> int:
+        # Smallest order whose block holds `size` units
+        return (size - 1).bit_length() if size > 1 else 0
+
+    def _push(self, start: int, order: int) -> None:
+        self.free_lists[order][start] = None
+        self.order_bitmap |= 1 << order
+
+    def _remove(self, start: int, order: int) -> None:
+        del self.free_lists[order][start]
+        if not self.free_lists[order]:
+            self.order_bitmap &= ~(1 << order)
+
+    def _pop(self, order: int) -> int:
+        start, _ = self.free_lists[order].popitem()
+        if not self.free_lists[order]:
+            self.order_bitmap &= ~(1 << order)
+        return start
+
+    def request(self, size: int, addr: Optional[int] = None) -> int:
+        order = self.order_for(size)
+        if order > self.max_order:
+            return -1
+        if addr is None:
+            # Bit-scan for the smallest non-empty order that can hold the request
+            orders = self.order_bitmap >> order
+            if not orders:
+                return -1
+            block_order = order + (orders & -orders).bit_length() - 1
+            start = self._pop(block_order)
+        else:
+            # A fixed address must be aligned to the block size and lie in a free block
+            if addr % (1 << order):
+                return -1
+            block_order = order
+            start = addr
+            while start not in self.free_lists[block_order]:
+                block_order += 1
+                if block_order > self.max_order:
+                    return -1
+                start = addr & ~((1 << block_order) - 1)
+            self._remove(start, block_order)
+        # Split down to the requested order, returning the halves that do not hold `addr`
+        target = start if addr is None else addr
+        while block_order > order:
+            block_order -= 1
+            half = 1 << block_order
+            if target & half:
+                self._push(start, block_order)
+                start += half
+            else:
+                self._push(start + half, block_order)
+        self.allocated_blocks[start] = order, size
+        self.allocated_bytes += 1 << order
+        self.requested_bytes += size
+        return start
+
+    def release(self, start: int, size: int) -> bool:
+        # Whole blocks only: `start` must be a block returned by request and `size` the size that
+        # was requested. Anything else is refused rather than freeing units the caller still uses.
+        if start not in self.allocated_blocks:
+            return False
+        order, requested_size = self.allocated_blocks[start]
+        if size != requested_size:
+            return False
+        del self.allocated_blocks[start]
+        self.allocated_bytes -= 1 << order
+        self.requested_bytes -= requested_size
+        # Coalesce with the buddy while it is free at the same order
+        while order < self.max_order:
+            buddy = start ^ (1 << order)
+            if buddy not in self.free_lists[order]:
+                break
+            self._remove(buddy, order)
+            start = min(start, buddy)
+            order += 1
+        self._push(start, order)
+        return True
+
+    def internal_fragmentation(self) -> int:
+        # Units handed out beyond what the live requests asked for
+        return self.allocated_bytes - self.requested_bytes
+
+    def free_blocks(self) -> List[Tuple[int, int]]:
+        # (start, size) of every free block in address order
+        return sorted((start, 1 << order) for order, free_list in enumerate(self.free_lists) for start in free_list)
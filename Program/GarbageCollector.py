@@ -0,0 +1,372 @@
+import enum
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from MemoryManager import MemoryManager, HANDLE_SLOT_BITS
+
+SLOT_MASK = (1 << HANDLE_SLOT_BITS) - 1
+SWEEP_BATCH = 8  # Garbage blocks freed together by one incremental sweep batch
+
+
+class GarbageCollector:
+    # A mark-and-sweep collector over the handles of a MemoryManager. Callers register roots
+    # and record references between blocks; collect() marks every block reachable from the
+    # roots and frees all other handle blocks of the manager in one batch. The collector owns
+    # every handle of its manager, so blocks must be allocated through allocate() or
+    # MemoryManager.alloc. Blocks requested by address have no handle and are never swept.
+
+    def __init__(self, memory_manager: MemoryManager) -> None:
+        self.memory_manager = memory_manager
+        self.roots: Set[int] = set()
+        self.references: Dict[int, Set[int]] = {}  # Handle -> handles it points to
+        self.pause_times: List[float] = []  # Seconds spent in each collect()
+
+    def allocate(self, size: int) -> int:
+        # Returns a handle, or -1. A failed request is retried once after a collection.
+        handle = self.memory_manager.alloc(size)
+        if handle == -1 and size > 0:
+            self.collect()
+            handle = self.memory_manager.alloc(size)
+        return handle
+
+    def add_root(self, handle: int) -> None:
+        self.roots.add(handle)
+
+    def remove_root(self, handle: int) -> None:
+        self.roots.discard(handle)
+
+    def add_reference(self, source: int, target: int) -> None:
+        self.references.setdefault(source, set()).add(target)
+
+    def remove_reference(self, source: int, target: int) -> None:
+        targets = self.references.get(source)
+        if targets is not None:
+            targets.discard(target)
+
+    def _mark(self) -> bytearray:
+        # One bit per handle slot, set for every block reachable from the roots
+        memory_manager = self.memory_manager
+        marks = bytearray((len(memory_manager.handle_starts) + 7) >> 3)
+        stack = list(self.roots)
+        while stack:
+            handle = stack.pop()
+            slot = memory_manager._handle_slot(handle)
+            if slot == -1 or marks[slot >> 3] & (1 << (slot & 7)):
+                continue  # Freed, stale or already marked
+            marks[slot >> 3] |= 1 << (slot & 7)
+            stack.extend(self.references.get(handle, ()))
+        return marks
+
+    def _sweep(self, marks: bytearray) -> Tuple[int, int]:
+        # Free every live handle whose bit is clear. The blocks are released in address
+        # order and coalesces each run of back-to-back garbage with its free neighbours once,
+        # instead of merging block by block.
+        memory_manager = self.memory_manager
+        garbage = [(memory_manager.handle_generations[slot] << HANDLE_SLOT_BITS) | slot
+                   for slot, size in enumerate(memory_manager.handle_sizes)
+                   if size != -1 and not marks[slot >> 3] & (1 << (slot & 7))]
+        garbage_bytes = sum(memory_manager.handle_sizes[handle & SLOT_MASK] for handle in garbage)
+        for handle in garbage:
+            self.references.pop(handle, None)
+        if garbage:
+            self._free(garbage)
+        return len(garbage), garbage_bytes
+
+    def _free(self, garbage: List[int]) -> None:
+        self.memory_manager._free_handles(garbage)  # free_many without building a NumPy result
+
+    def collect(self) -> Dict[str, float]:
+        # Returns the number of marked blocks, the freed blocks and bytes, and the pause time
+        start_time = time.perf_counter()
+        marks = self._mark()
+        freed_blocks, freed_bytes = self._sweep(marks)
+        pause = time.perf_counter() - start_time
+        self.pause_times.append(pause)
+        return {"marked": sum(bin(byte).count("1") for byte in marks), "freed_blocks": freed_blocks,
+                "freed_bytes": freed_bytes, "pause_seconds": pause}
+
+
+class GenerationalCollector(GarbageCollector):
+    # Adds a nursery of `nursery_size` units, reserved at the start of the arena, where new
+    # blocks are placed by bumping a pointer: an allocation only takes a handle slot and never
+    # touches the hash tables. When the nursery is full, minor_collect() traces the young blocks
+    # reachable from the roots and from the remembered set, evacuates them into the main space
+    # and resets the pointer. Blocks larger than the nursery go to the main space directly.
+    # References must be recorded with add_reference, whose write barrier keeps the remembered
+    # set of old blocks that point into the nursery. collect() is a full collection of both.
+
+    def __init__(self, memory_manager: MemoryManager, nursery_size: int = 4096) -> None:
+        super().__init__(memory_manager)
+        assert 0 < nursery_size < memory_manager.total_memory, "The nursery must be smaller than the arena."
+        self.nursery_start = memory_manager._request(nursery_size, 0)
+        assert self.nursery_start != -1, "The nursery must fit at the start of the arena."
+        self.nursery_end = self.nursery_start + nursery_size
+        # Young blocks are only given back by minor collections; the manager refuses to release them
+        memory_manager.reserved_range = self.nursery_start, self.nursery_end
+        self.bump = self.nursery_start
+        self.young_slots: List[int] = []  # May hold slots that were freed or reused since
+        self.remembered: Set[int] = set()  # Old handles with references to young blocks
+        self.minor_pause_times: List[float] = []
+
+    def _is_young_slot(self, slot: int) -> bool:
+        return self.nursery_start <= self.memory_manager.handle_starts[slot] < self.nursery_end
+
+    def is_young(self, handle: int) -> bool:
+        slot = self.memory_manager._handle_slot(handle)
+        return slot != -1 and self._is_young_slot(slot)
+
+    def allocate(self, size: int) -> int:
+        if size <= 0:
+            return -1
+        if self.bump + size > self.nursery_end:
+            if size > self.nursery_end - self.nursery_start:
+                return super().allocate(size)
+            self.minor_collect()
+            if self.bump + size > self.nursery_end:
+                return super().allocate(size)  # Survivors that could not be evacuated fill the nursery
+        handle = self.memory_manager._new_handle(self.bump, size)
+        self.bump += size
+        self.young_slots.append(handle & SLOT_MASK)
+        return handle
+
+    def add_reference(self, source: int, target: int) -> None:
+        super().add_reference(source, target)
+        # Write barrier: an old block pointing to a young one is a root of minor collections
+        if self.is_young(target) and not self.is_young(source):
+            self.remembered.add(source)
+
+    def _free(self, garbage: List[int]) -> None:
+        # Young garbage only gives its slot back; its nursery space returns at the next minor collection
+        old_garbage = []
+        for handle in garbage:
+            self.remembered.discard(handle)
+            if self._is_young_slot(handle & SLOT_MASK):
+                self.memory_manager._retire_handle_slot(handle & SLOT_MASK)
+            else:
+                old_garbage.append(handle)
+        if old_garbage:
+            super()._free(old_garbage)
+
+    def _trace_young(self) -> List[int]:
+        # Slots of the young blocks reachable from the roots and the remembered set. Old blocks
+        # are assumed live and are not traced.
+        memory_manager = self.memory_manager
+        stack = list(self.roots)
+        for source in self.remembered:
+            stack.extend(self.references.get(source, ()))
+        live = set()
+        survivors = []
+        while stack:
+            handle = stack.pop()
+            slot = memory_manager._handle_slot(handle)
+            if slot == -1 or slot in live or not self._is_young_slot(slot):
+                continue
+            live.add(slot)
+            survivors.append(slot)
+            stack.extend(self.references.get(handle, ()))
+        return survivors
+
+    def _evacuate(self, survivors: List[int]) -> int:
+        # Move survivors, in address order, into the main space. They are placed back to back
+        # in one block where possible, so a minor collection costs one request. Returns how many
+        # were moved.
+        memory_manager = self.memory_manager
+        if not survivors:
+            return 0  # A zero-sized request would be served at the nursery's own address
+        if memory_manager.buddy_allocator is None:
+            start = memory_manager._request(sum(memory_manager.handle_sizes[slot] for slot in survivors), None, tagged=True)
+            if start != -1:
+                memory_manager._place_handles(start, survivors)
+                return len(survivors)
+        for moved, slot in enumerate(survivors):
+            start = memory_manager._request(memory_manager.handle_sizes[slot], None, tagged=True)
+            if start == -1:
+                return moved
+            memory_manager._place_handles(start, [slot])
+        return len(survivors)
+
+    def minor_collect(self) -> Dict[str, float]:
+        # Returns the survivor and promotion counts, the freed young blocks and bytes, and the pause time
+        start_time = time.perf_counter()
+        memory_manager = self.memory_manager
+        survivors = self._trace_young()
+        live = set(survivors)
+        freed_blocks = freed_bytes = 0
+        for slot in self.young_slots:
+            if slot not in live and memory_manager.handle_sizes[slot] != -1 and self._is_young_slot(slot):
+                freed_blocks += 1
+                freed_bytes += memory_manager.handle_sizes[slot]
+                self.references.pop((memory_manager.handle_generations[slot] << HANDLE_SLOT_BITS) | slot, None)
+                memory_manager._retire_handle_slot(slot)
+        survivors.sort(key=lambda slot: memory_manager.handle_starts[slot])
+        promoted = self._evacuate(survivors)
+        if promoted < len(survivors):
+            # The main space is full: a full collection may make room for the rest
+            self.collect()
+            # Survivors kept only by a dead old block were freed by it
+            survivors = survivors[:promoted] + [slot for slot in survivors[promoted:]
+                                                if memory_manager.handle_sizes[slot] != -1]
+            promoted += self._evacuate(survivors[promoted:])
+        # Whatever is left slides down to the start of the nursery
+        self.young_slots = survivors[promoted:]
+        self.bump = self.nursery_start
+        for slot in self.young_slots:
+            memory_manager._move_handle(slot, self.bump)
+            self.bump += memory_manager.handle_sizes[slot]
+        if self.young_slots:
+            self.remembered = {source for source, targets in self.references.items()
+                               if not self.is_young(source) and any(self.is_young(target) for target in targets)}
+        else:
+            self.remembered = set()
+        pause = time.perf_counter() - start_time
+        self.minor_pause_times.append(pause)
+        return {"survivors": len(survivors), "promoted": promoted, "freed_blocks": freed_blocks,
+                "freed_bytes": freed_bytes, "pause_seconds": pause}
+
+
+class CollectorPhase(enum.Enum):
+    IDLE = 0
+    MARKING = 1
+    SWEEPING = 2
+
+
+class IncrementalCollector(GarbageCollector):
+    # Spreads a collection over many short collect_step() calls that can be interleaved with
+    # allocations and other manager operations. Marking is tri-color: white blocks have a
+    # clear bit, grey blocks wait on the grey stack, black blocks have their bit set and their
+    # references scanned. The write barrier in add_reference and add_root greys the new
+    # target, so a black block never points to a white one and nothing reachable is freed.
+    # While sweeping it blackens the target instead, since a block from MemoryManager.alloc
+    # may reuse a slot that is white and still ahead of the sweep cursor. Blocks allocated
+    # through allocate() during a cycle start black. Blocks that become unreachable during a
+    # cycle are freed by the next one. collect() is still a full stop-the-world collection.
+
+    def __init__(self, memory_manager: MemoryManager) -> None:
+        super().__init__(memory_manager)
+        self.phase = CollectorPhase.IDLE
+        self.marks = bytearray()
+        self.grey: List[int] = []
+        self.sweep_cursor = 0
+        self.sweep_end = 0
+        self.step_pause_times: List[float] = []
+        self.pause_buckets: List[int] = []  # Bucket i counts steps of [2 ** (i - 1), 2 ** i) microseconds
+
+    def _set_mark(self, slot: int) -> None:
+        if slot >= len(self.marks) << 3:
+            self.marks.extend(bytes((slot >> 3) + 1 - len(self.marks)))
+        self.marks[slot >> 3] |= 1 << (slot & 7)
+
+    def _is_marked(self, slot: int) -> bool:
+        return slot < len(self.marks) << 3 and self.marks[slot >> 3] & (1 << (slot & 7))
+
+    def allocate(self, size: int) -> int:
+        handle = super().allocate(size)
+        if handle != -1 and self.phase != CollectorPhase.IDLE:
+            self._set_mark(handle & SLOT_MASK)  # Allocated black
+        return handle
+
+    def _shade(self, handle: int) -> None:
+        # Write barrier: grey a white target while marking runs, and blacken it while sweeping,
+        # when marking is over and the sweep would otherwise free it. Black or freed targets are
+        # skipped, so repeated writes to the same block do not grow the grey stack.
+        if self.phase == CollectorPhase.IDLE:
+            return
+        slot = self.memory_manager._handle_slot(handle)
+        if slot != -1 and not self._is_marked(slot):
+            if self.phase == CollectorPhase.MARKING:
+                self.grey.append(handle)
+            else:
+                self._set_mark(slot)
+
+    def add_root(self, handle: int) -> None:
+        super().add_root(handle)
+        self._shade(handle)
+
+    def add_reference(self, source: int, target: int) -> None:
+        super().add_reference(source, target)
+        self._shade(target)
+
+    def collect(self) -> Dict[str, float]:
+        # Abandons a running incremental cycle; the full collection covers it
+        self.phase = CollectorPhase.IDLE
+        self.grey = []
+        return super().collect()
+
+    def collect_step(self, max_objects: Optional[int] = None, max_micros: Optional[float] = None) -> Dict[str, object]:
+        # Do at most `max_objects` units of work (grey entries popped or slots swept) and stop once
+        # `max_micros` microseconds have passed; with neither, the cycle runs to the end.
+        # Starts a new cycle when idle. Returns the phase after the step, the work done and the pause.
+        assert max_objects is None or max_objects > 0, "The parameter `max_objects` must be positive."
+        start_time = time.perf_counter()
+        deadline = None if max_micros is None else start_time + max_micros / 1e6
+        memory_manager = self.memory_manager
+        work = 0
+        if self.phase == CollectorPhase.IDLE:
+            self.marks = bytearray((len(memory_manager.handle_starts) + 7) >> 3)
+            self.grey = list(self.roots)
+            self.phase = CollectorPhase.MARKING
+        while self.phase != CollectorPhase.IDLE:
+            if max_objects is not None and work >= max_objects:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if self.phase == CollectorPhase.MARKING:
+                if not self.grey:
+                    self.phase = CollectorPhase.SWEEPING
+                    self.sweep_cursor = 0
+                    self.sweep_end = len(memory_manager.handle_starts)  # Later slots were allocated black
+                    continue
+                handle = self.grey.pop()
+                work += 1  # Every pop counts, so duplicate grey entries cannot stretch a step
+                slot = memory_manager._handle_slot(handle)
+                if slot == -1 or self._is_marked(slot):
+                    continue  # Freed, stale or already black
+                self._set_mark(slot)
+                self.grey.extend(self.references.get(handle, ()))
+            else:
+                work += self._sweep_slots(max_objects - work if max_objects is not None else None, deadline)
+                if self.sweep_cursor >= self.sweep_end:
+                    self.phase = CollectorPhase.IDLE
+        pause = time.perf_counter() - start_time
+        self.step_pause_times.append(pause)
+        bucket = int(pause * 1e6).bit_length()
+        if bucket >= len(self.pause_buckets):
+            self.pause_buckets.extend([0] * (bucket + 1 - len(self.pause_buckets)))
+        self.pause_buckets[bucket] += 1
+        return {"phase": self.phase.name, "work": work, "pause_seconds": pause}
+
+    def _sweep_slots(self, max_slots: Optional[int], deadline: Optional[float]) -> int:
+        # Sweep slots from the cursor within the budget. The white blocks found are freed in
+        # address-sorted batches of up to SWEEP_BATCH, so the deadline also bounds the freeing.
+        memory_manager = self.memory_manager
+        garbage = []
+        swept = 0
+        while self.sweep_cursor < self.sweep_end:
+            if max_slots is not None and swept >= max_slots:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            slot = self.sweep_cursor
+            self.sweep_cursor += 1
+            swept += 1
+            if memory_manager.handle_sizes[slot] != -1 and slot < len(self.marks) << 3 and not self._is_marked(slot):
+                garbage.append((memory_manager.handle_generations[slot] << HANDLE_SLOT_BITS) | slot)
+                if len(garbage) == SWEEP_BATCH:
+                    self._free_swept(garbage)
+                    garbage = []
+        if garbage:
+            self._free_swept(garbage)
+        return swept
+
+    def _free_swept(self, garbage: List[int]) -> None:
+        for handle in garbage:
+            self.references.pop(handle, None)
+        self._free(garbage)
+
+    def pause_histogram(self) -> List[int]:
+        # Step counts per power-of-two microsecond bucket: [< 1 us, 1 us, 2-3 us, 4-7 us, ...]
+        return list(self.pause_buckets)
+
+    def pause_percentile(self, fraction: float) -> float:
+        # Step pause in seconds at `fraction` (0.99 for p99) of all steps so far
+        pauses = sorted(self.step_pause_times)
+        return pauses[min(len(pauses) - 1, int(len(pauses) * fraction))] if pauses else 0.0
@@ -1,6 +1,28 @@
-from typing import List, Tuple, Any, Optional
-import numpy as np
+import array
+import enum
+import itertools
+from typing import Dict, List, Tuple, Any, Optional
+
+
+class TreeBackend(enum.Enum):
+    BST = 0
+    AVL = 1
+    COMPACT = 2  # AVL trees in a struct-of-arrays node pool; integer keys and values only
+
+
+# Upper bound on the first level so huge address spaces do not allocate millions of buckets
+MAX_FIRST_LEVEL_BITS = 16
+LOG2_FRACTION_BITS = 16  # Fractional bits of the fixed-point log2 in TwoLevelHashTableList
+
+
+def default_first_level_bits(bits: int) -> int:
+    # One bucket per 2 ** (2 * bits / 3) keys, capped for TB-scale address spaces
+    return min(bits // 3, MAX_FIRST_LEVEL_BITS)
+
+
 class BSTNode:
+    __slots__ = ("key", "value", "left", "right")
+
     def __init__(self, key: int, value: object):
         self.key = key
         self.value = value
@@ -10,57 +32,113 @@ class BSTNode:
 class BST:
     def __init__(self):
         self.root: Optional[BSTNode] = None
+        self.node_count = 0  # Kept up to date on insert and delete so counting never traverses the tree
 
-    def _insert(self, node: Optional[BSTNode], key: int, value: Any) -> BSTNode:
-        if node is None:
-            return BSTNode(key, value)
-        if key < node.key:
-            node.left = self._insert(node.left, key, value)
-        elif key > node.key:
-            node.right = self._insert(node.right, key, value)
-        else:
-            node.value = value  # Update existing key
-        return node
+    def _make_node(self, key: int, value: Any) -> BSTNode:
+        return BSTNode(key, value)
 
-    def insert(self, key: int, value: Any) -> None:
-        self.root = self._insert(self.root, key, value)
+    def _update_value(self, node: BSTNode, value: Any) -> None:
+        node.value = value  # Update existing key
 
-    def _query(self, node: Optional[BSTNode], key: int) -> Optional[Any]:
-        if node is None:
-            return None
-        if key < node.key:
-            return self._query(node.left, key)
-        elif key > node.key:
-            return self._query(node.right, key)
+    def _rebalance(self, node: BSTNode) -> BSTNode:
+        # A plain BST never rebalances; balanced subclasses override this hook
+        return node
+
+    def _retrace(self, path: List[Tuple[BSTNode, bool]], subtree: Optional[BSTNode]) -> None:
+        # Hang `subtree` under the last node of the search path; balanced subclasses
+        # also walk the path back towards the root to rotate.
+        if not path:
+            self.root = subtree
+            return
+        parent, went_left = path[-1]
+        if went_left:
+            parent.left = subtree
         else:
-            return node.value
+            parent.right = subtree
+
+    def insert(self, key: int, value: Any) -> bool:
+        # Returns True if a new node was created and False if an existing key was updated
+        path = []
+        node = self.root
+        while node is not None:
+            if key < node.key:
+                path.append((node, True))
+                node = node.left
+            elif key > node.key:
+                path.append((node, False))
+                node = node.right
+            else:
+                self._update_value(node, value)
+                self._value_updated(path, node)
+                return False
+        self._retrace(path, self._make_node(key, value))
+        self.node_count += 1
+        return True
 
-    def query(self, key: int) -> Optional[Any]:
-        return self._query(self.root, key)
+    def _value_updated(self, path: List[Tuple[BSTNode, bool]], node: BSTNode) -> None:
+        # Augmented subclasses refresh the summaries along the search path here
+        pass
 
-    def _delete(self, node: Optional[BSTNode], key: int) -> Optional[BSTNode]:
-        if node is None:
-            return None
-        if key < node.key:
-            node.left = self._delete(node.left, key)
-        elif key > node.key:
-            node.right = self._delete(node.right, key)
-        else:
-            if node.left is None:
-                return node.right
-            if node.right is None:
-                return node.left
-            min_larger_node = self.find_min(node.right)
+    def _query(self, node: Optional[BSTNode], key: int) -> Optional[BSTNode]:
+        while node is not None:
+            if key < node.key:
+                node = node.left
+            elif key > node.key:
+                node = node.right
+            else:
+                return node
+        return None
+
+    def query(self, key: int) -> Optional[Any]:
+        node = self._query(self.root, key)
+        return node.value if node is not None else None
+
+    def _search_path(self, key: int) -> Tuple[List[Tuple[BSTNode, bool]], Optional[BSTNode]]:
+        path = []
+        node = self.root
+        while node is not None and node.key != key:
+            went_left = key < node.key
+            path.append((node, went_left))
+            node = node.left if went_left else node.right
+        return path, node
+
+    def _remove_node(self, path: List[Tuple[BSTNode, bool]], node: BSTNode) -> None:
+        if node.left is not None and node.right is not None:
+            # Node has two children, copy the inorder successor into it and unlink the successor
+            path.append((node, False))
+            min_larger_node = node.right
+            while min_larger_node.left is not None:
+                path.append((min_larger_node, True))
+                min_larger_node = min_larger_node.left
             node.key, node.value = min_larger_node.key, min_larger_node.value
-            node.right = self._delete(node.right, min_larger_node.key)
-        return node
+            node = min_larger_node
+        self._retrace(path, node.left if node.left is not None else node.right)
+        self.node_count -= 1
 
     def delete(self, key: int) -> bool:
-        if self.query(key) is None:
+        path, node = self._search_path(key)
+        if node is None:
             return False
-        self.root = self._delete(self.root, key)
+        self._remove_node(path, node)
         return True
 
+    def build(self, items: List[Tuple[int, Any]]) -> None:
+        # Replace the tree with a balanced one built from `items` sorted by key, in linear time.
+        # Values are stored as they are, so list trees take each key's list of values.
+        def build_range(low: int, high: int) -> Optional[BSTNode]:
+            if low >= high:
+                return None
+            middle = (low + high) // 2
+            key, value = items[middle]
+            node = self._make_node(key, value)
+            node.value = value
+            node.left = build_range(low, middle)
+            node.right = build_range(middle + 1, high)
+            return self._rebalance(node)  # Only refreshes the summaries, the halves are already balanced
+
+        self.root = build_range(0, len(items))
+        self.node_count = len(items)
+
     def find_min(self, node: BSTNode) -> BSTNode:
         current = node
         while current.left is not None:
@@ -77,9 +155,17 @@ class BST:
         return self._inorder_traversal(self.root)
 
     def _inorder_traversal(self, node: Optional[BSTNode]) -> List[Tuple[int, Any]]:
-        if node is None:
-            return []
-        return self._inorder_traversal(node.left) + [(node.key, node.value)] + self._inorder_traversal(node.right)
+        # Explicit stack instead of recursion so degenerate trees cannot overflow the interpreter stack
+        items = []
+        stack = []
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            items.append((node.key, node.value))
+            node = node.right
+        return items
 
     def find_successor(self, key: int) -> Optional[BSTNode]:
         current = self.root
@@ -127,28 +213,667 @@ class BST:
 
         return predecessor
 
+    # (key, value) lookups shared with the compact backend, whose nodes are not objects
+    def min_item(self) -> Optional[Tuple[int, Any]]:
+        if self.root is None:
+            return None
+        node = self.find_min(self.root)
+        return node.key, node.value
+
+    def max_item(self) -> Optional[Tuple[int, Any]]:
+        if self.root is None:
+            return None
+        node = self.find_max(self.root)
+        return node.key, node.value
+
+    def successor_item(self, key: int) -> Optional[Tuple[int, Any]]:
+        node = self.find_successor(key)
+        return (node.key, node.value) if node is not None else None
+
+    def predecessor_item(self, key: int) -> Optional[Tuple[int, Any]]:
+        node = self.find_predecessor(key)
+        return (node.key, node.value) if node is not None else None
+
+
+class AVLNode(BSTNode):
+    __slots__ = ("height",)
+
+    def __init__(self, key: int, value: object):
+        super().__init__(key, value)
+        self.height = 1
+
+
+class AVLBalancer:
+    # Mixin that turns BST or BSTList into an AVL tree through the _retrace and _rebalance hooks
+    def _height(self, node) -> int:
+        return node.height if node is not None else 0
+
+    def _update_height(self, node) -> None:
+        node.height = 1 + max(self._height(node.left), self._height(node.right))
+
+    def _rotate_left(self, node):
+        pivot = node.right
+        node.right = pivot.left
+        pivot.left = node
+        self._update_height(node)
+        self._update_height(pivot)
+        return pivot
+
+    def _rotate_right(self, node):
+        pivot = node.left
+        node.left = pivot.right
+        pivot.right = node
+        self._update_height(node)
+        self._update_height(pivot)
+        return pivot
+
+    def _rebalance(self, node):
+        self._update_height(node)
+        balance = self._height(node.left) - self._height(node.right)
+        if balance > 1:
+            if self._height(node.left.left) < self._height(node.left.right):
+                node.left = self._rotate_left(node.left)  # Left-right case
+            return self._rotate_right(node)
+        if balance < -1:
+            if self._height(node.right.right) < self._height(node.right.left):
+                node.right = self._rotate_right(node.right)  # Right-left case
+            return self._rotate_left(node)
+        return node
+
+    def _retrace(self, path, subtree) -> None:
+        # Walk the search path back towards the root without recursion
+        while path:
+            parent, went_left = path.pop()
+            if went_left:
+                parent.left = subtree
+            else:
+                parent.right = subtree
+            old_height = parent.height
+            subtree = self._rebalance(parent)
+            if subtree is parent and parent.height == old_height:
+                return  # Nothing changed, so the ancestors are still balanced
+        self.root = subtree
+
+
+class AVLTree(AVLBalancer, BST):
+    def _make_node(self, key: int, value: Any) -> AVLNode:
+        return AVLNode(key, value)
+
+
+class MaxAVLNode(AVLNode):
+    __slots__ = ("max_value",)
+
+    def __init__(self, key: int, value: int):
+        super().__init__(key, value)
+        self.max_value = value  # Largest value stored in the subtree rooted here
+
+
+class MaxAVLTree(AVLTree):
+    # AVL tree over integer values where every node also tracks its subtree maximum
+    def _make_node(self, key: int, value: int) -> MaxAVLNode:
+        return MaxAVLNode(key, value)
+
+    def _update_height(self, node: MaxAVLNode) -> None:
+        super()._update_height(node)
+        max_value = node.value
+        if node.left is not None and node.left.max_value > max_value:
+            max_value = node.left.max_value
+        if node.right is not None and node.right.max_value > max_value:
+            max_value = node.right.max_value
+        node.max_value = max_value
+
+    def _retrace(self, path, subtree) -> None:
+        # Deleting a node with two children copies a value into an ancestor, so the
+        # maxima are refreshed all the way to the root instead of stopping early.
+        while path:
+            parent, went_left = path.pop()
+            if went_left:
+                parent.left = subtree
+            else:
+                parent.right = subtree
+            subtree = self._rebalance(parent)
+        self.root = subtree
+
+    def _value_updated(self, path, node: MaxAVLNode) -> None:
+        self._update_height(node)
+        for parent, _ in reversed(path):
+            previous_max = parent.max_value
+            self._update_height(parent)
+            if parent.max_value == previous_max:
+                break
+
+    def _first_at_least(self, node: MaxAVLNode, value: int) -> MaxAVLNode:
+        # Leftmost node of the subtree whose value is at least `value`; the subtree must hold one
+        while True:
+            if node.left is not None and node.left.max_value >= value:
+                node = node.left
+            elif node.value >= value:
+                return node
+            else:
+                node = node.right
+
+    def find_first_at_least(self, value: int, lower_key: Optional[int] = None) -> Optional[MaxAVLNode]:
+        # Smallest key (not below `lower_key`) whose value is at least `value`
+        if lower_key is None:
+            if self.root is None or self.root.max_value < value:
+                return None
+            return self._first_at_least(self.root, value)
+        # Keys >= lower_key are the nodes where the search for lower_key turns left, each
+        # followed by its right subtree. The deepest of them holds the smallest keys.
+        candidates = []
+        node = self.root
+        while node is not None:
+            if node.key < lower_key:
+                node = node.right
+            else:
+                candidates.append(node)
+                if node.key == lower_key:
+                    break
+                node = node.left
+        for node in reversed(candidates):
+            if node.value >= value:
+                return node
+            if node.right is not None and node.right.max_value >= value:
+                return self._first_at_least(node.right, value)
+        return None
+
+    def first_at_least_item(self, value: int, lower_key: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        node = self.find_first_at_least(value, lower_key)
+        return (node.key, node.value) if node is not None else None
+
+    def max_value(self) -> int:
+        # Largest value in the tree, or -1 when it is empty
+        return self.root.max_value if self.root is not None else -1
+
+
+NIL = -1  # The null link of compact trees
+
+
+def column_typecode(largest: int) -> str:
+    # Narrowest array typecode for a column of non-negative integers up to `largest`
+    return "I" if largest < 2 ** 32 else "q"
+
+
+class NodePool:
+    # Struct-of-arrays storage for the nodes of all the compact trees of one hash table. A node
+    # is an index into parallel typed arrays instead of a Python object. With 32-bit keys and
+    # values a node takes 17 bytes (21 with subtree maxima), 25 (33) with 64-bit ones.
+    # Released nodes go on a free-node list and are reused first.
+    def __init__(self, max_augmented: bool = False, key_typecode: str = "q", value_typecode: str = "q"):
+        self.keys = array.array(key_typecode)
+        self.values = array.array(value_typecode)
+        self.lefts = array.array("i")
+        self.rights = array.array("i")
+        self.heights = array.array("b")
+        self.maxes = array.array(value_typecode) if max_augmented else None  # Largest value in each subtree
+        self.free_nodes = array.array("i")
+        self.overflow: Dict[int, List[int]] = {}  # All values of list-tree nodes holding more than one
+
+    def allocate(self, key: int, value: int) -> int:
+        if self.free_nodes:
+            node = self.free_nodes.pop()
+            self.keys[node] = key
+            self.values[node] = value
+            self.lefts[node] = NIL
+            self.rights[node] = NIL
+            self.heights[node] = 1
+            if self.maxes is not None:
+                self.maxes[node] = value
+            return node
+        self.keys.append(key)
+        self.values.append(value)
+        self.lefts.append(NIL)
+        self.rights.append(NIL)
+        self.heights.append(1)
+        if self.maxes is not None:
+            self.maxes.append(value)
+        return len(self.keys) - 1
+
+    def release(self, node: int) -> None:
+        self.free_nodes.append(node)
+
+
+class CompactAVLTree:
+    # The AVL tree of AVLTree (or MaxAVLTree when the pool keeps maxima) over a NodePool.
+    # Nodes are integer indices and NIL is the null link; lookups return (key, value) items.
+    # The pool stores keys relative to `base`, so a bucket's keys fit in a narrow key column.
+    __slots__ = ("pool", "base", "root", "node_count")
+
+    def __init__(self, pool: NodePool, base: int = 0):
+        self.pool = pool
+        self.base = base
+        self.root = NIL
+        self.node_count = 0
+
+    def _item(self, node: int) -> Tuple[int, Any]:
+        return self.pool.keys[node] + self.base, self._value(node)
+
+    def _value(self, node: int) -> Any:
+        return self.pool.values[node]
+
+    def _update_value(self, node: int, value: int) -> None:
+        self.pool.values[node] = value
+
+    def _make_node(self, key: int, value: Any) -> int:
+        return self.pool.allocate(key, value)
+
+    def _height(self, node: int) -> int:
+        return self.pool.heights[node] if node != NIL else 0
+
+    def _update_height(self, node: int) -> None:
+        pool = self.pool
+        left = pool.lefts[node]
+        right = pool.rights[node]
+        pool.heights[node] = 1 + max(self._height(left), self._height(right))
+        if pool.maxes is not None:
+            max_value = pool.values[node]
+            if left != NIL and pool.maxes[left] > max_value:
+                max_value = pool.maxes[left]
+            if right != NIL and pool.maxes[right] > max_value:
+                max_value = pool.maxes[right]
+            pool.maxes[node] = max_value
+
+    def _rotate_left(self, node: int) -> int:
+        pool = self.pool
+        pivot = pool.rights[node]
+        pool.rights[node] = pool.lefts[pivot]
+        pool.lefts[pivot] = node
+        self._update_height(node)
+        self._update_height(pivot)
+        return pivot
+
+    def _rotate_right(self, node: int) -> int:
+        pool = self.pool
+        pivot = pool.lefts[node]
+        pool.lefts[node] = pool.rights[pivot]
+        pool.rights[pivot] = node
+        self._update_height(node)
+        self._update_height(pivot)
+        return pivot
+
+    def _rebalance(self, node: int) -> int:
+        pool = self.pool
+        self._update_height(node)
+        left = pool.lefts[node]
+        right = pool.rights[node]
+        balance = self._height(left) - self._height(right)
+        if balance > 1:
+            if self._height(pool.lefts[left]) < self._height(pool.rights[left]):
+                pool.lefts[node] = self._rotate_left(left)  # Left-right case
+            return self._rotate_right(node)
+        if balance < -1:
+            if self._height(pool.rights[right]) < self._height(pool.lefts[right]):
+                pool.rights[node] = self._rotate_right(right)  # Right-left case
+            return self._rotate_left(node)
+        return node
+
+    def _retrace(self, path: List[Tuple[int, bool]], subtree: int) -> None:
+        # Maxima can change above an unchanged height, so augmented trees walk the whole path
+        pool = self.pool
+        while path:
+            parent, went_left = path.pop()
+            if went_left:
+                pool.lefts[parent] = subtree
+            else:
+                pool.rights[parent] = subtree
+            old_height = pool.heights[parent]
+            subtree = self._rebalance(parent)
+            if pool.maxes is None and subtree == parent and pool.heights[parent] == old_height:
+                return  # Nothing changed, so the ancestors are still balanced
+        self.root = subtree
+
+    def insert(self, key: int, value: int) -> bool:
+        # Returns True if a new node was created and False if an existing key was updated
+        pool = self.pool
+        key -= self.base
+        path = []
+        node = self.root
+        while node != NIL:
+            node_key = pool.keys[node]
+            if key < node_key:
+                path.append((node, True))
+                node = pool.lefts[node]
+            elif key > node_key:
+                path.append((node, False))
+                node = pool.rights[node]
+            else:
+                self._update_value(node, value)
+                if pool.maxes is not None:
+                    self._update_height(node)
+                    for parent, _ in reversed(path):
+                        previous_max = pool.maxes[parent]
+                        self._update_height(parent)
+                        if pool.maxes[parent] == previous_max:
+                            break
+                return False
+        self._retrace(path, self._make_node(key, value))
+        self.node_count += 1
+        return True
+
+    def _search_path(self, key: int) -> Tuple[List[Tuple[int, bool]], int]:
+        pool = self.pool
+        key -= self.base
+        path = []
+        node = self.root
+        while node != NIL and pool.keys[node] != key:
+            went_left = key < pool.keys[node]
+            path.append((node, went_left))
+            node = pool.lefts[node] if went_left else pool.rights[node]
+        return path, node
+
+    def query(self, key: int) -> Optional[Any]:
+        pool = self.pool
+        key -= self.base
+        node = self.root
+        while node != NIL:
+            node_key = pool.keys[node]
+            if key < node_key:
+                node = pool.lefts[node]
+            elif key > node_key:
+                node = pool.rights[node]
+            else:
+                return self._value(node)
+        return None
+
+    def _remove_node(self, path: List[Tuple[int, bool]], node: int) -> None:
+        pool = self.pool
+        pool.overflow.pop(node, None)
+        if pool.lefts[node] != NIL and pool.rights[node] != NIL:
+            # Node has two children, copy the inorder successor into it and unlink the successor
+            path.append((node, False))
+            min_larger_node = pool.rights[node]
+            while pool.lefts[min_larger_node] != NIL:
+                path.append((min_larger_node, True))
+                min_larger_node = pool.lefts[min_larger_node]
+            pool.keys[node] = pool.keys[min_larger_node]
+            pool.values[node] = pool.values[min_larger_node]
+            if min_larger_node in pool.overflow:
+                pool.overflow[node] = pool.overflow.pop(min_larger_node)
+            node = min_larger_node
+        self._retrace(path, pool.lefts[node] if pool.lefts[node] != NIL else pool.rights[node])
+        pool.release(node)
+        self.node_count -= 1
+
+    def delete(self, key: int) -> bool:
+        path, node = self._search_path(key)
+        if node == NIL:
+            return False
+        self._remove_node(path, node)
+        return True
+
+    def build(self, items: List[Tuple[int, Any]]) -> None:
+        # Replace the tree with a balanced one built from `items` sorted by key, in linear time
+        pool = self.pool
+
+        def build_range(low: int, high: int) -> int:
+            if low >= high:
+                return NIL
+            middle = (low + high) // 2
+            key, value = items[middle]
+            node = self._make_node(key - self.base, value)
+            pool.lefts[node] = build_range(low, middle)
+            pool.rights[node] = build_range(middle + 1, high)
+            self._update_height(node)
+            return node
+
+        self.root = build_range(0, len(items))
+        self.node_count = len(items)
+
+    def items(self) -> List[Tuple[int, Any]]:
+        pool = self.pool
+        items = []
+        stack = []
+        node = self.root
+        while stack or node != NIL:
+            while node != NIL:
+                stack.append(node)
+                node = pool.lefts[node]
+            node = stack.pop()
+            items.append(self._item(node))
+            node = pool.rights[node]
+        return items
+
+    def min_item(self) -> Optional[Tuple[int, Any]]:
+        if self.root == NIL:
+            return None
+        node = self.root
+        while self.pool.lefts[node] != NIL:
+            node = self.pool.lefts[node]
+        return self._item(node)
+
+    def max_item(self) -> Optional[Tuple[int, Any]]:
+        if self.root == NIL:
+            return None
+        node = self.root
+        while self.pool.rights[node] != NIL:
+            node = self.pool.rights[node]
+        return self._item(node)
+
+    def successor_item(self, key: int) -> Optional[Tuple[int, Any]]:
+        # Smallest key greater than `key`; the deepest node where the search turns left
+        pool = self.pool
+        key -= self.base
+        successor = NIL
+        node = self.root
+        while node != NIL:
+            if key < pool.keys[node]:
+                successor = node
+                node = pool.lefts[node]
+            else:
+                node = pool.rights[node]
+        return self._item(successor) if successor != NIL else None
+
+    def predecessor_item(self, key: int) -> Optional[Tuple[int, Any]]:
+        # Largest key smaller than `key`; the deepest node where the search turns right
+        pool = self.pool
+        key -= self.base
+        predecessor = NIL
+        node = self.root
+        while node != NIL:
+            if key > pool.keys[node]:
+                predecessor = node
+                node = pool.rights[node]
+            else:
+                node = pool.lefts[node]
+        return self._item(predecessor) if predecessor != NIL else None
+
+    def max_value(self) -> int:
+        # Largest value in the tree, or -1 when it is empty. Needs a max-augmented pool.
+        return self.pool.maxes[self.root] if self.root != NIL else -1
+
+    def first_at_least_item(self, value: int, lower_key: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        # Smallest key (not below `lower_key`) whose value is at least `value`, as in MaxAVLTree
+        pool = self.pool
+        if lower_key is not None:
+            lower_key -= self.base
+            candidates = []
+            node = self.root
+            while node != NIL:
+                if pool.keys[node] < lower_key:
+                    node = pool.rights[node]
+                else:
+                    candidates.append(node)
+                    if pool.keys[node] == lower_key:
+                        break
+                    node = pool.lefts[node]
+            for node in reversed(candidates):
+                if pool.values[node] >= value:
+                    return pool.keys[node] + self.base, pool.values[node]
+                right = pool.rights[node]
+                if right != NIL and pool.maxes[right] >= value:
+                    return self._first_at_least(right, value)
+            return None
+        if self.root == NIL or pool.maxes[self.root] < value:
+            return None
+        return self._first_at_least(self.root, value)
+
+    def _first_at_least(self, node: int, value: int) -> Tuple[int, int]:
+        # Leftmost item of the subtree whose value is at least `value`; the subtree must hold one
+        pool = self.pool
+        while True:
+            left = pool.lefts[node]
+            if left != NIL and pool.maxes[left] >= value:
+                node = left
+            elif pool.values[node] >= value:
+                return pool.keys[node] + self.base, pool.values[node]
+            else:
+                node = pool.rights[node]
+
+
+class CompactAVLTreeList(CompactAVLTree):
+    # List values for TwoLevelHashTableList. A key with one value keeps it inline in the pool;
+    # only keys with several values get a Python list, in pool.overflow.
+    __slots__ = ()
+
+    def _value(self, node: int) -> List[int]:
+        values = self.pool.overflow.get(node)
+        return values if values is not None else [self.pool.values[node]]
+
+    def _update_value(self, node: int, value: int) -> None:
+        # Append the value to the existing values for this key, without duplicates
+        values = self.pool.overflow.get(node)
+        if values is None:
+            if value != self.pool.values[node]:
+                self.pool.overflow[node] = [self.pool.values[node], value]
+        elif value not in values:
+            values.append(value)
+
+    def _make_node(self, key: int, value: Any) -> int:
+        # `value` is one value on insert and the list of values when building
+        if not isinstance(value, list):
+            return self.pool.allocate(key, value)
+        node = self.pool.allocate(key, value[0])
+        if len(value) > 1:
+            self.pool.overflow[node] = list(value)
+        return node
+
+    def delete(self, key: int, value: Any = None) -> bool:
+        path, node = self._search_path(key)
+        if node == NIL:
+            return False
+        # If a value is specified, remove it from the values for this key
+        if value is not None:
+            values = self.pool.overflow.get(node)
+            if values is None:
+                if self.pool.values[node] != value:
+                    return True  # The value is not stored, so the node stays in the tree
+            else:
+                if value in values:
+                    values.remove(value)
+                self.pool.values[node] = values[0]
+                if len(values) == 1:
+                    del self.pool.overflow[node]
+                return True
+        # Either no value was specified or its only value was removed, so remove the node
+        self._remove_node(path, node)
+        return True
+
+
+class BucketBitmap:
+    # Occupancy of the first-level buckets packed into 64-bit words. A summary integer
+    # holds one bit per non-zero word, so as in TLSF allocators the next or previous
+    # non-empty bucket is found with two bit scans instead of a loop over the buckets.
+    WORD_BITS = 64
+
+    def __init__(self, size: int):
+        self.size = size
+        self.words = [0] * ((size + self.WORD_BITS - 1) // self.WORD_BITS)
+        self.summary = 0
+
+    def __getitem__(self, index: int) -> int:
+        if not 0 <= index < self.size:
+            raise IndexError("bucket index out of range")  # Also ends iteration at the bucket count
+        return (self.words[index >> 6] >> (index & 63)) & 1
+
+    def __len__(self) -> int:
+        return self.size
+
+    def set(self, index: int, value: int) -> None:
+        word_index = index >> 6
+        if value:
+            self.words[word_index] |= 1 << (index & 63)
+            self.summary |= 1 << word_index
+        else:
+            self.words[word_index] &= ~(1 << (index & 63))
+            if not self.words[word_index]:
+                self.summary &= ~(1 << word_index)
+
+    def next_set(self, index: int) -> int:
+        # Smallest set index that is >= index, or -1
+        if index >= self.size:
+            return -1
+        word_index = index >> 6
+        word = self.words[word_index] >> (index & 63)
+        if word:
+            return index + (word & -word).bit_length() - 1  # Isolate the lowest set bit
+        summary = self.summary >> (word_index + 1)
+        if not summary:
+            return -1
+        word_index += (summary & -summary).bit_length()
+        word = self.words[word_index]
+        return (word_index << 6) + (word & -word).bit_length() - 1
+
+    def previous_set(self, index: int) -> int:
+        # Largest set index that is <= index, or -1
+        if index < 0:
+            return -1
+        index = min(index, self.size - 1)
+        word_index = index >> 6
+        word = self.words[word_index] & ((2 << (index & 63)) - 1)
+        if word:
+            return (word_index << 6) + word.bit_length() - 1
+        summary = self.summary & ((1 << word_index) - 1)
+        if not summary:
+            return -1
+        word_index = summary.bit_length() - 1
+        return (word_index << 6) + self.words[word_index].bit_length() - 1
+
+
 class TwoLevelHashTable:
-    def __init__(self, bits: int):
+    TREE_CLASSES = {TreeBackend.BST: BST, TreeBackend.AVL: AVLTree, TreeBackend.COMPACT: CompactAVLTree}
+
+    def __init__(self, bits: int, backend: TreeBackend = TreeBackend.BST, first_level_bits: Optional[int] = None):
         self.bits = bits
-        self.capacity = 2 ** (bits // 3)
+        if first_level_bits is None:
+            first_level_bits = default_first_level_bits(bits)
+        self.first_level_bits = min(first_level_bits, bits)
+        self.capacity = 2 ** self.first_level_bits
+        self.shift = bits - self.first_level_bits  # Keys sharing their top first_level_bits share a bucket
+        self.backend = backend
+        self.tree_class = self.TREE_CLASSES[backend]
         self.buckets: List[Optional[BST]] = [None] * self.capacity
-        self.bitmap = [0] * self.capacity
+        self.bitmap = BucketBitmap(self.capacity)
+        self.entry_count = 0  # Keys across all buckets
+        # Compact trees of all buckets share one node pool
+        self.node_pool = self._new_node_pool() if backend == TreeBackend.COMPACT else None
+
+    def _new_node_pool(self, max_augmented: bool = False) -> NodePool:
+        # Keys are stored relative to their bucket, so they only need the low `shift` bits
+        return NodePool(max_augmented, column_typecode(2 ** self.shift - 1), column_typecode(2 ** self.bits))
+
+    def _new_tree(self, first_level_index: int):
+        if self.node_pool is not None:
+            return self.tree_class(self.node_pool, first_level_index << self.shift)
+        return self.tree_class()
 
     def set_bitmap(self, index: int, value: int) -> None:
-        self.bitmap[index] = value  # Set the bitmap value at the given index
+        self.bitmap.set(index, value)  # Set the bitmap value at the given index
 
     def first_level_hash(self, key: int) -> int:
-        bucket_index = key * self.capacity // (2 ** self.bits)
+        bucket_index = key >> self.shift
         return bucket_index
 
-    def insert(self, key: int, value: Any) -> None:
+    def insert(self, key: int, value: Any) -> bool:
         first_level_index = self.first_level_hash(key)
 
         if self.buckets[first_level_index] is None:
-            self.buckets[first_level_index] = BST()
+            self.buckets[first_level_index] = self._new_tree(first_level_index)
             self.set_bitmap(first_level_index, 1)  # Mark this bucket as non-empty
 
-        self.buckets[first_level_index].insert(key, value)
+        inserted = self.buckets[first_level_index].insert(key, value)
+        if inserted:
+            self.entry_count += 1
+        return inserted
 
     def query(self, key: int) -> Optional[Any]:
         first_level_index = self.first_level_hash(key)
@@ -163,29 +888,42 @@ class TwoLevelHashTable:
             return False
 
         deleted = self.buckets[first_level_index].delete(key)
+        if deleted:
+            self.entry_count -= 1
 
-        if deleted and not self.buckets[first_level_index].root:
+        if deleted and self.buckets[first_level_index].node_count == 0:
             self.buckets[first_level_index] = None
             self.set_bitmap(first_level_index, 0)  # Mark this bucket as empty
 
         return deleted
 
+    def build(self, items: List[Tuple[int, Any]]) -> None:
+        # Replace the contents with `items` sorted by key. The hash is monotone, so each bucket
+        # holds one contiguous run of the items and its tree is built balanced in linear time.
+        self.buckets = [None] * self.capacity
+        self.bitmap = BucketBitmap(self.capacity)
+        if self.node_pool is not None:
+            self.node_pool = self._new_node_pool(self.node_pool.maxes is not None)
+        for first_level_index, bucket_items in itertools.groupby(items, key=lambda item: self.first_level_hash(item[0])):
+            self.buckets[first_level_index] = self._new_tree(first_level_index)
+            self.buckets[first_level_index].build(list(bucket_items))
+            self.set_bitmap(first_level_index, 1)  # Mark this bucket as non-empty
+        self.entry_count = len(items)
+
     def next_larger_key(self, key: int) -> Optional[Tuple[int, Any]]:
         first_level_index = self.first_level_hash(key)
 
         # Find the successor within the same bucket
         if self.buckets[first_level_index] is not None:
-            successor_node = self.buckets[first_level_index].find_successor(key)
-            if successor_node:
-                return successor_node.key, successor_node.value
-
-        # If not found, move to the next non-empty bucket
-        for next_bucket_index in range(first_level_index + 1, self.capacity):
-            if self.buckets[next_bucket_index] is not None:
-                # Get the minimum key in this bucket
-                min_node = self.buckets[next_bucket_index].find_min(self.buckets[next_bucket_index].root)
-                if min_node:
-                    return min_node.key, min_node.value
+            successor = self.buckets[first_level_index].successor_item(key)
+            if successor is not None:
+                return successor
+
+        # If not found, bit-scan forward to the next non-empty bucket
+        next_bucket_index = self.bitmap.next_set(first_level_index + 1)
+        if next_bucket_index != -1:
+            # Get the minimum key in this bucket
+            return self.buckets[next_bucket_index].min_item()
 
         # If we reach here, there is no larger key in the hash table
         return -1, -1
@@ -195,28 +933,24 @@ class TwoLevelHashTable:
 
         # Find the predecessor within the same bucket
         if self.buckets[first_level_index] is not None:
-            predecessor_node = self.buckets[first_level_index].find_predecessor(key)
-            if predecessor_node:
-                return predecessor_node.key, predecessor_node.value
-
-        # If not found, move to the previous non-empty bucket
-        for next_bucket_index in range(first_level_index -1, -1, -1):
-            if self.buckets[next_bucket_index] is not None:
-                # Get the maximum key in this bucket
-                max_node = self.buckets[next_bucket_index].find_max(self.buckets[next_bucket_index].root)
-                if max_node:
-                    return max_node.key, max_node.value
+            predecessor = self.buckets[first_level_index].predecessor_item(key)
+            if predecessor is not None:
+                return predecessor
+
+        # If not found, bit-scan backward to the previous non-empty bucket
+        previous_bucket_index = self.bitmap.previous_set(first_level_index - 1)
+        if previous_bucket_index != -1:
+            # Get the maximum key in this bucket
+            return self.buckets[previous_bucket_index].max_item()
 
         # If we reach here, there is no smaller key in the hash table
         return -1, -1
 
     def max_key(self) -> Optional[Tuple[int, Any]]:
-        for bucket_index in range(self.capacity - 1, -1, -1):
-            if self.buckets[bucket_index] is not None:
-                # Find the maximum key within this non-empty bucket
-                max_node = self.buckets[bucket_index].find_max(self.buckets[bucket_index].root)
-                if max_node:
-                    return max_node.key, max_node.value
+        bucket_index = self.bitmap.previous_set(self.capacity - 1)
+        if bucket_index != -1:
+            # Find the maximum key within the highest non-empty bucket
+            return self.buckets[bucket_index].max_item()
 
         # If we reach here, there is no key in the hash table
         return -1, -1
@@ -229,177 +963,189 @@ class TwoLevelHashTable:
                 all_items_list.extend(second_level_items)
         return all_items_list
 
+class FreeAddressIndex(TwoLevelHashTable):
+    # Free blocks keyed by start address with their sizes as values. Each tree node
+    # tracks the largest free size in its subtree and a segment tree over the buckets
+    # tracks the largest free size per bucket, so first fit is one logarithmic descent.
+    # The trees are MaxAVLTrees, or compact trees over a max-augmented pool for COMPACT.
+    def __init__(self, bits: int, first_level_bits: Optional[int] = None, backend: TreeBackend = TreeBackend.AVL):
+        if backend == TreeBackend.COMPACT:
+            super().__init__(bits, TreeBackend.COMPACT, first_level_bits)
+            self.node_pool = self._new_node_pool(max_augmented=True)
+        else:
+            super().__init__(bits, TreeBackend.AVL, first_level_bits)
+            self.tree_class = MaxAVLTree
+        self.bucket_max = array.array("q", [-1]) * (2 * self.capacity)  # Unboxed, unlike a list of ints
+
+    def _update_bucket_max(self, index: int) -> None:
+        bucket = self.buckets[index]
+        position = index + self.capacity
+        self.bucket_max[position] = bucket.max_value() if bucket is not None else -1
+        position //= 2
+        while position:
+            max_value = max(self.bucket_max[2 * position], self.bucket_max[2 * position + 1])
+            if self.bucket_max[position] == max_value:
+                break
+            self.bucket_max[position] = max_value
+            position //= 2
+
+    def insert(self, key: int, value: int) -> bool:
+        inserted = super().insert(key, value)
+        self._update_bucket_max(self.first_level_hash(key))
+        return inserted
+
+    def delete(self, key: int) -> bool:
+        deleted = super().delete(key)
+        if deleted:
+            self._update_bucket_max(self.first_level_hash(key))
+        return deleted
+
+    def build(self, items: List[Tuple[int, int]]) -> None:
+        super().build(items)
+        # Fill the segment tree bottom-up in one pass
+        for index, bucket in enumerate(self.buckets):
+            self.bucket_max[index + self.capacity] = bucket.max_value() if bucket is not None else -1
+        for position in range(self.capacity - 1, 0, -1):
+            self.bucket_max[position] = max(self.bucket_max[2 * position], self.bucket_max[2 * position + 1])
+
+    def max_value(self) -> int:
+        # The largest free size in the index, or -1 when it is empty
+        return self.bucket_max[1]
+
+    def _first_bucket_at_least(self, size: int, index: int) -> int:
+        # Lowest bucket index >= index whose largest free size is at least `size`, or -1
+        if index >= self.capacity:
+            return -1
+        position = index + self.capacity
+        while self.bucket_max[position] < size:
+            # Climb while this is a right child, then step to the next subtree on the right
+            while position & 1:
+                position >>= 1
+            if position == 0:
+                return -1
+            position += 1
+        while position < self.capacity:
+            position *= 2
+            if self.bucket_max[position] < size:
+                position += 1
+        return position - self.capacity
+
+    def first_fit(self, size: int, lower: int = 0) -> Tuple[int, int]:
+        # Lowest start address (not below `lower`) whose free size is at least `size`
+        index = self.first_level_hash(lower)
+        bucket = self.buckets[index]
+        if bucket is not None:
+            item = bucket.first_at_least_item(size, lower)
+            if item is not None:
+                return item
+        index = self._first_bucket_at_least(size, index + 1)
+        if index == -1:
+            return -1, -1
+        return self.buckets[index].first_at_least_item(size)
+
+
 class BSTNodeList:
+    __slots__ = ("key", "value", "left", "right")
+
     def __init__(self, key: int, value: object):
         self.key = key
         self.value = [value] if not isinstance(value, list) else value
         self.left: Optional[BSTNodeList] = None
         self.right: Optional[BSTNodeList] = None
 
-class BSTList:
+class BSTList(BST):
     def __init__(self):
+        super().__init__()
         self.root: Optional[BSTNodeList] = None
 
-    def _insert(self, node: Optional[BSTNodeList], key: int, value: Any) -> BSTNodeList:
-        if node is None:
-            return BSTNodeList(key, [value])  # Wrap the value in a list when creating a new node
-        if key < node.key:
-            node.left = self._insert(node.left, key, value)
-        elif key > node.key:
-            node.right = self._insert(node.right, key, value)
-        else:
-            # Append the value to the existing list for this key
-            if value not in node.value:  # Optional: prevent duplicate values in the list
-                node.value.append(value)
-        return node
-
-    def insert(self, key: int, value: Any) -> None:
-        self.root = self._insert(self.root, key, value)
-
-    def _query(self, node: Optional[BSTNodeList], key: int) -> Optional[Any]:
-        if node is None:
-            return None
-        if key < node.key:
-            return self._query(node.left, key)
-        elif key > node.key:
-            return self._query(node.right, key)
-        else:
-            return node.value
+    def _make_node(self, key: int, value: Any) -> BSTNodeList:
+        return BSTNodeList(key, [value])  # Wrap the value in a list when creating a new node
 
-    def query(self, key: int) -> Optional[Any]:
-        return self._query(self.root, key)
-
-    def _delete(self, node: Optional[BSTNodeList], key: int, value: Any = None) -> Optional[BSTNodeList]:
-        if node is None:
-            return None
-        if key < node.key:
-            node.left = self._delete(node.left, key, value)
-        elif key > node.key:
-            node.right = self._delete(node.right, key, value)
-        else:
-            # If a value is specified, remove it from the list of values for this key
-            if value is not None:
-                if value in node.value:
-                    node.value.remove(value)
-                # If the list of values is now empty, remove the node
-                if not node.value:
-                    # Node has no values left and should be removed
-                    if node.left is None:
-                        return node.right
-                    if node.right is None:
-                        return node.left
-                    # Node has two children, find the inorder successor
-                    min_larger_node = self.find_min(node.right)
-                    node.key, node.value = min_larger_node.key, min_larger_node.value
-                    node.right = self._delete(node.right, min_larger_node.key)
-            else:
-                # No value specified, this means remove the node with this key
-                if node.left is None:
-                    return node.right
-                if node.right is None:
-                    return node.left
-                min_larger_node = self.find_min(node.right)
-                node.key, node.value = min_larger_node.key, min_larger_node.value
-                node.right = self._delete(node.right, min_larger_node.key)
-        return node
+    def _update_value(self, node: BSTNodeList, value: Any) -> None:
+        # Append the value to the existing list for this key
+        if value not in node.value:  # Optional: prevent duplicate values in the list
+            node.value.append(value)
 
     def delete(self, key: int, value: Any = None) -> bool:
-        if self.query(key) is None:
+        path, node = self._search_path(key)
+        if node is None:
             return False
-        self.root = self._delete(self.root, key, value)
+        # If a value is specified, remove it from the list of values for this key
+        if value is not None:
+            if value in node.value:
+                node.value.remove(value)
+            if node.value:
+                # Other values remain, so the node stays in the tree
+                return True
+        # Either no value was specified or the list is now empty, so remove the node
+        self._remove_node(path, node)
         return True
 
-    def find_min(self, node: BSTNodeList) -> BSTNodeList:
-        current = node
-        while current.left is not None:
-            current = current.left
-        return current
-
-    def find_max(self, node: Optional[BSTNodeList]) -> BSTNodeList:
-        current = node
-        while current.right is not None:
-            current = current.right
-        return current
 
-    def items(self) -> List[Tuple[int, Any]]:
-        return self._inorder_traversal(self.root)
-
-    def _inorder_traversal(self, node: Optional[BSTNodeList]) -> List[Tuple[int, Any]]:
-        if node is None:
-            return []
-        # The inorder traversal will include the key and the entire list of values
-        return self._inorder_traversal(node.left) + [(node.key, node.value)] + self._inorder_traversal(node.right)
-
-    def find_successor(self, key: int) -> Optional[BSTNodeList]:
-        current = self.root
-        successor = None
-
-        while current:
-            if key < current.key:
-                successor = current
-                current = current.left
-            elif key > current.key:
-                current = current.right
-            else:
-                # Node with the matching key found
-                if current.right:
-                    # The successor is the minimum key node in the right subtree
-                    successor = self.find_min(current.right)
-                    break
-                else:
-                    # There is no right child, the successor is one of the ancestors
-                    # The loop has already set the correct successor in this case
-                    break
+class AVLNodeList(BSTNodeList):
+    __slots__ = ("height",)
 
-        return successor
+    def __init__(self, key: int, value: object):
+        super().__init__(key, value)
+        self.height = 1
 
-    def find_predecessor(self, key: int) -> Optional[BSTNodeList]:
-        current = self.root
-        predecessor = None
 
-        while current:
-            if key > current.key:
-                predecessor = current
-                current = current.right
-            elif key < current.key:
-                current = current.left
-            else:
-                # Node with the matching key found
-                if current.left:
-                    # The predecessor is the maximum key node in the left subtree
-                    predecessor = self.find_max(current.left)
-                    break
-                else:
-                    # There is no left child, the predecessor is one of the ancestors
-                    # The loop has already set the correct predecessor in this case
-                    break
+class AVLTreeList(AVLBalancer, BSTList):
+    def _make_node(self, key: int, value: Any) -> AVLNodeList:
+        return AVLNodeList(key, [value])  # Wrap the value in a list when creating a new node
 
-        return predecessor
 
 class TwoLevelHashTableList:
-    def __init__(self, bits: int):
+    TREE_CLASSES = {TreeBackend.BST: BSTList, TreeBackend.AVL: AVLTreeList, TreeBackend.COMPACT: CompactAVLTreeList}
+
+    def __init__(self, bits: int, backend: TreeBackend = TreeBackend.BST, first_level_bits: Optional[int] = None):
         self.bits = bits
         self.M = 2 ** bits
-        self.capacity = 2 ** (bits // 3)
+        if first_level_bits is None:
+            first_level_bits = default_first_level_bits(bits)
+        self.first_level_bits = first_level_bits
+        self.capacity = 2 ** first_level_bits
+        self.backend = backend
+        self.tree_class = self.TREE_CLASSES[backend]
         self.buckets: List[Optional[BSTList]] = [None] * self.capacity
-        self.bitmap = [0] * self.capacity
+        self.bitmap = BucketBitmap(self.capacity)
+        self.entry_count = 0  # Distinct keys across all buckets
+        # Compact trees of all buckets share one node pool
+        self.node_pool = self._new_node_pool() if backend == TreeBackend.COMPACT else None
+
+    def _new_node_pool(self, max_augmented: bool = False) -> NodePool:
+        # Keys are sizes up to M and values are addresses below it
+        return NodePool(max_augmented, column_typecode(self.M), column_typecode(self.M - 1))
+
+    def _new_tree(self):
+        return self.tree_class(self.node_pool) if self.node_pool is not None else self.tree_class()
 
     def set_bitmap(self, index: int, value: int) -> None:
-        self.bitmap[index] = value  # Set the bitmap value at the given index
+        self.bitmap.set(index, value)  # Set the bitmap value at the given index
 
     def first_level_hash(self, key: int) -> int:
+        # Buckets split log2(key) evenly over [0, bits). log2 is computed in fixed point with
+        # integer arithmetic: the exponent from bit_length and a linear approximation of the
+        # mantissa, which is exact at powers of two and keeps the hash monotone in the key.
         if key == self.M:
             key = key - 1
-        bucket_index = int(self.capacity * np.log2(key) // self.bits)
+        if key <= 1:
+            return 0
+        exponent = key.bit_length() - 1
+        fixed_point_log2 = (exponent << LOG2_FRACTION_BITS) + ((key << LOG2_FRACTION_BITS) >> exponent) - (1 << LOG2_FRACTION_BITS)
+        bucket_index = self.capacity * fixed_point_log2 // (self.bits << LOG2_FRACTION_BITS)
 
         return bucket_index
 
-    def insert(self, key: int, value: Any) -> None:
+    def insert(self, key: int, value: Any) -> bool:
         first_level_index = self.first_level_hash(key)
         if self.buckets[first_level_index] is None:
-            self.buckets[first_level_index] = BSTList()
+            self.buckets[first_level_index] = self._new_tree()
             self.set_bitmap(first_level_index, 1)  # Mark this bucket as non-empty
-        self.buckets[first_level_index].insert(key, value)
+        inserted = self.buckets[first_level_index].insert(key, value)
+        if inserted:
+            self.entry_count += 1
+        return inserted
 
     def query(self, key: int) -> Optional[Any]:
         first_level_index = self.first_level_hash(key)
@@ -413,30 +1159,44 @@ class TwoLevelHashTableList:
         if self.buckets[first_level_index] is None:
             return False
 
+        node_count = self.buckets[first_level_index].node_count
         deleted = self.buckets[first_level_index].delete(key, value)
+        # Removing one value from a key's list keeps the key's node
+        self.entry_count -= node_count - self.buckets[first_level_index].node_count
 
-        if deleted and not self.buckets[first_level_index].root:
+        if deleted and self.buckets[first_level_index].node_count == 0:
             self.buckets[first_level_index] = None
             self.set_bitmap(first_level_index, 0)  # Mark this bucket as empty
 
         return deleted
 
+    def build(self, items: List[Tuple[int, Any]]) -> None:
+        # Replace the contents with `items` sorted by key. The hash is monotone, so each bucket
+        # holds one contiguous run of the items and its tree is built balanced in linear time.
+        self.buckets = [None] * self.capacity
+        self.bitmap = BucketBitmap(self.capacity)
+        if self.node_pool is not None:
+            self.node_pool = self._new_node_pool(self.node_pool.maxes is not None)
+        for first_level_index, bucket_items in itertools.groupby(items, key=lambda item: self.first_level_hash(item[0])):
+            self.buckets[first_level_index] = self._new_tree()
+            self.buckets[first_level_index].build(list(bucket_items))
+            self.set_bitmap(first_level_index, 1)  # Mark this bucket as non-empty
+        self.entry_count = len(items)
+
     def next_larger_key(self, key: int) -> Optional[Tuple[int, Any]]:
         first_level_index = self.first_level_hash(key)
 
         # Find the successor within the same bucket
         if self.buckets[first_level_index] is not None:
-            successor_node = self.buckets[first_level_index].find_successor(key)
-            if successor_node:
-                return successor_node.key, successor_node.value
-
-        # If not found, move to the next non-empty bucket
-        for next_bucket_index in range(first_level_index + 1, self.capacity):
-            if self.buckets[next_bucket_index] is not None:
-                # Get the minimum key in this bucket
-                min_node = self.buckets[next_bucket_index].find_min(self.buckets[next_bucket_index].root)
-                if min_node:
-                    return min_node.key, min_node.value
+            successor = self.buckets[first_level_index].successor_item(key)
+            if successor is not None:
+                return successor
+
+        # If not found, bit-scan forward to the next non-empty bucket
+        next_bucket_index = self.bitmap.next_set(first_level_index + 1)
+        if next_bucket_index != -1:
+            # Get the minimum key in this bucket
+            return self.buckets[next_bucket_index].min_item()
 
         # If we reach here, there is no larger key in the hash table
         return -1, -1
@@ -446,28 +1206,24 @@ class TwoLevelHashTableList:
 
         # Find the predecessor within the same bucket
         if self.buckets[first_level_index] is not None:
-            predecessor_node = self.buckets[first_level_index].find_predecessor(key)
-            if predecessor_node:
-                return predecessor_node.key, predecessor_node.value
-
-        # If not found, move to the previous non-empty bucket
-        for next_bucket_index in range(first_level_index -1, -1, -1):
-            if self.buckets[next_bucket_index] is not None:
-                # Get the maximum key in this bucket
-                max_node = self.buckets[next_bucket_index].find_max(self.buckets[next_bucket_index].root)
-                if max_node:
-                    return max_node.key, max_node.value
+            predecessor = self.buckets[first_level_index].predecessor_item(key)
+            if predecessor is not None:
+                return predecessor
+
+        # If not found, bit-scan backward to the previous non-empty bucket
+        previous_bucket_index = self.bitmap.previous_set(first_level_index - 1)
+        if previous_bucket_index != -1:
+            # Get the maximum key in this bucket
+            return self.buckets[previous_bucket_index].max_item()
 
         # If we reach here, there is no smaller key in the hash table
         return -1, -1
 
     def max_key(self) -> Optional[Tuple[int, Any]]:
-        for bucket_index in range(self.capacity - 1, -1, -1):
-            if self.buckets[bucket_index] is not None:
-                # Find the maximum key within this non-empty bucket
-                max_node = self.buckets[bucket_index].find_max(self.buckets[bucket_index].root)
-                if max_node:
-                    return max_node.key, max_node.value
+        bucket_index = self.bitmap.previous_set(self.capacity - 1)
+        if bucket_index != -1:
+            # Find the maximum key within the highest non-empty bucket
+            return self.buckets[bucket_index].max_item()
 
         # If we reach here, there is no key in the hash table
         return -1, -1
@@ -479,4 +1235,107 @@ class TwoLevelHashTableList:
             if second_level_hash_table is not None:
                 second_level_items = second_level_hash_table.items()
                 all_items_list.extend(second_level_items)
-        return all_items_list
\ No newline at end of file
+        return all_items_list
+
+class SegregatedFitIndex:
+    # Two-level segregated fit (TLSF) index over free blocks. The first level splits sizes
+    # into power-of-two classes and the second level splits each class linearly into
+    # 2 ** SL_BITS lists. Bitmaps mark the non-empty lists, so finding a list whose blocks
+    # are all large enough takes a fixed number of bit scans. Each list is a doubly linked
+    # list threaded through dictionaries keyed by start address, so insert and delete are O(1).
+    SL_BITS = 4
+    OWN_LIST_PROBES = 8
+
+    def __init__(self):
+        self.fl_bitmap = 0
+        self.sl_bitmaps: Dict[int, int] = {}
+        self.heads: Dict[Tuple[int, int], int] = {}
+        self.next_block: Dict[int, int] = {}
+        self.previous_block: Dict[int, int] = {}
+        self.block_sizes: Dict[int, int] = {}
+
+    def mapping_insert(self, size: int) -> Tuple[int, int]:
+        # The (first level, second level) list that a block of this size belongs to
+        if size < (1 << self.SL_BITS):
+            return 0, size  # Small sizes get one list each
+        fl = size.bit_length() - 1
+        sl = (size >> (fl - self.SL_BITS)) ^ (1 << self.SL_BITS)
+        return fl - self.SL_BITS + 1, sl
+
+    def mapping_search(self, size: int) -> Tuple[int, int]:
+        # Round the size up to the next list boundary so every block in the list fits
+        if size >= (1 << self.SL_BITS):
+            size += (1 << (size.bit_length() - 1 - self.SL_BITS)) - 1
+        return self.mapping_insert(size)
+
+    def insert(self, start: int, size: int) -> None:
+        fl, sl = self.mapping_insert(size)
+        head = self.heads.get((fl, sl), -1)
+        self.next_block[start] = head
+        self.previous_block[start] = -1
+        if head != -1:
+            self.previous_block[head] = start
+        self.heads[(fl, sl)] = start
+        self.block_sizes[start] = size
+        self.fl_bitmap |= 1 << fl
+        self.sl_bitmaps[fl] = self.sl_bitmaps.get(fl, 0) | (1 << sl)
+
+    def delete(self, start: int, size: int) -> None:
+        fl, sl = self.mapping_insert(size)
+        next_start = self.next_block.pop(start)
+        previous_start = self.previous_block.pop(start)
+        del self.block_sizes[start]
+        if next_start != -1:
+            self.previous_block[next_start] = previous_start
+        if previous_start != -1:
+            self.next_block[previous_start] = next_start
+            return
+        if next_start != -1:
+            self.heads[(fl, sl)] = next_start
+            return
+        # The list is now empty
+        del self.heads[(fl, sl)]
+        self.sl_bitmaps[fl] &= ~(1 << sl)
+        if not self.sl_bitmaps[fl]:
+            self.fl_bitmap &= ~(1 << fl)
+
+    def blocks(self) -> List[Tuple[int, int]]:
+        # (start, size) of every block, ordered so that inserting them one by one rebuilds
+        # every list in its current order: each list from its tail to its head
+        blocks = []
+        for head in self.heads.values():
+            list_blocks = []
+            start = head
+            while start != -1:
+                list_blocks.append((start, self.block_sizes[start]))
+                start = self.next_block[start]
+            blocks.extend(reversed(list_blocks))
+        return blocks
+
+    def find(self, size: int) -> Tuple[int, int]:
+        # (start, size) of a free block with at least `size` units, or (-1, -1)
+        fl, sl = self.mapping_search(size)
+        sl_map = self.sl_bitmaps.get(fl, 0) & (-1 << sl)
+        if not sl_map:
+            fl_map = self.fl_bitmap & (-1 << (fl + 1))
+            if not fl_map:
+                return self._find_in_own_list(size)
+            fl = (fl_map & -fl_map).bit_length() - 1
+            sl_map = self.sl_bitmaps[fl]
+        sl = (sl_map & -sl_map).bit_length() - 1
+        start = self.heads[(fl, sl)]
+        return start, self.block_sizes[start]
+
+    def _find_in_own_list(self, size: int) -> Tuple[int, int]:
+        # Rounding up skips the list the size itself maps to, which may still hold a block
+        # that fits. It is only probed when no larger list has any block, and only its first
+        # OWN_LIST_PROBES blocks, so the search stays constant time; a fitting block further
+        # down the list is missed, as in the original TLSF which never probes this list.
+        start = self.heads.get(self.mapping_insert(size), -1)
+        for _ in range(self.OWN_LIST_PROBES):
+            if start == -1:
+                break
+            if self.block_sizes[start] >= size:
+                return start, self.block_sizes[start]
+            start = self.next_block[start]
+        return -1, -1
@@ -1,18 +1,51 @@
+import array
 import enum
-from typing import Dict, List, Tuple
+import sys
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, Union
 from MemoryOperation import MemoryOperation
 from MemoryOperation import MemoryOperationType
-from HashTable import TwoLevelHashTable, TwoLevelHashTableList
-import numpy as np
+from BuddyAllocator import BuddyAllocator
+from HashTable import TwoLevelHashTable, TwoLevelHashTableList, FreeAddressIndex, SegregatedFitIndex, TreeBackend, default_first_level_bits
+if TYPE_CHECKING:
+    import numpy as np  # Imported lazily by the batch APIs, which are the only users
 
 
 class MemoryStrategy(enum.Enum):
     FIRST_FIT = 0
     BEST_FIT = 1
     WORST_FIT = 2
+    TLSF = 3
+    BUDDY = 4
+    NEXT_FIT = 5
+
+
+SNAPSHOT_MAGIC = b"GCSNAP02"  # 02 added the handle table
+HANDLE_SLOT_BITS = 32  # A handle is (generation << HANDLE_SLOT_BITS) | slot
+
+
+def _write_array(output_file, values: List[int]) -> None:
+    # A length-prefixed run of little-endian int64 values
+    data = array.array("q", [len(values)] + list(values))
+    if sys.byteorder == "big":
+        data.byteswap()
+    data.tofile(output_file)
+
+
+def _read_array(input_file) -> List[int]:
+    length = array.array("q")
+    length.fromfile(input_file, 1)
+    data = array.array("q")
+    if sys.byteorder == "big":
+        length.byteswap()
+    data.fromfile(input_file, length[0])
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tolist()
 
 
 class Block:
+    __slots__ = ("start", "size")
+
     def __init__(self, start: int, size: int):
         self.start = start
         self.size = size
@@ -20,33 +53,113 @@ class Block:
 
 class MemoryManager:
 
-    def __init__(self, strategy: MemoryStrategy) -> None:
+    def __init__(self, strategy: MemoryStrategy, total_memory: int = 1024,
+                 first_level_bits: Union[int, Callable[[int], int], None] = None,
+                 backend: TreeBackend = TreeBackend.AVL) -> None:
+        # `first_level_bits` sets the number of first-level buckets (2 ** first_level_bits). It is
+        # either a fixed value or a policy mapping the address-space bits to it.
+        assert total_memory > 1, "The parameter `total_memory` must be at least 2."
         self.strategy = strategy
-        self.total_memory = 1024 # Can be modified
-        self.total_memory_bits = int(np.ceil(np.log2(self.total_memory)))
-        self.free_sizes_hash_table = TwoLevelHashTableList(self.total_memory_bits)
-        self.free_addresses_hash_table = TwoLevelHashTable(self.total_memory_bits)
-        self.allocated_addresses_hash_table = TwoLevelHashTable(self.total_memory_bits)
-        self.free_sizes_hash_table.insert(self.total_memory, 0) # A list with one element: the start address of the free block.
-        self.free_addresses_hash_table.insert(0, self.total_memory) # The whole memory block starts at address 0 and is free.
-        self.allocated_addresses_hash_table.insert(0, 0)  # A placeholder block
+        self.total_memory = total_memory
+        self.total_memory_bits = (self.total_memory - 1).bit_length()  # ceil(log2(total_memory))
+        if first_level_bits is None:
+            first_level_bits = default_first_level_bits
+        if callable(first_level_bits):
+            first_level_bits = first_level_bits(self.total_memory_bits)
+        self.first_level_bits = first_level_bits
+        self.backend = backend
+        self._build_tables(0)  # The whole memory block starts at address 0 and is free
+        self.next_fit_cursor = 0  # Roving pointer: the end of the last NEXT_FIT allocation
+        # The buddy system keeps its own per-order free lists and bypasses the hash tables
+        self.buddy_allocator: Optional[BuddyAllocator] = None
+        if strategy == MemoryStrategy.BUDDY:
+            self.buddy_allocator = BuddyAllocator(self.total_memory)
+        self.telemetry = None  # A Telemetry.TelemetryRecorder, see attach_telemetry
+        # Dense slot table behind the handle API. A free slot has size -1 and its generation is
+        # bumped on reuse, so stale handles are rejected.
+        self.handle_starts = array.array("q")
+        self.handle_sizes = array.array("q")
+        self.handle_generations = array.array("q")
+        self.free_handle_slots: List[int] = []
+        self.handle_slots_by_start: Dict[int, int] = {}  # Lets compact() move handles with their blocks
+        self.reserved_range: Optional[Tuple[int, int]] = None  # [start, end) that releases may not touch
+
+    def _build_tables(self, allocated_bytes: int) -> None:
+        # Fresh tables for a memory whose first `allocated_bytes` units are allocated and whose
+        # remainder is one free block. Used on construction and by a full compact().
+        free_size = self.total_memory - allocated_bytes
+        # Balanced second-level trees keep sequential-address workloads logarithmic. TLSF finds
+        # blocks through its segregated lists and coalesces through the address index, so it
+        # keeps no size table.
+        self.free_sizes_hash_table: Optional[TwoLevelHashTableList] = None
+        if self.strategy != MemoryStrategy.TLSF:
+            self.free_sizes_hash_table = TwoLevelHashTableList(self.total_memory_bits, self.backend, self.first_level_bits)
+        self.free_addresses_hash_table = FreeAddressIndex(self.total_memory_bits, self.first_level_bits, self.backend)  # Always max-augmented AVL
+        self.allocated_addresses_hash_table = TwoLevelHashTable(self.total_memory_bits, self.backend, self.first_level_bits)
+        self.allocated_addresses_hash_table.insert(0, allocated_bytes)  # A placeholder block when nothing is allocated
+        if allocated_bytes > 0:
+            self.free_addresses_hash_table.insert(0, 0)  # Address 0 stays as a placeholder
+        if free_size > 0:
+            if self.free_sizes_hash_table is not None:
+                self.free_sizes_hash_table.insert(free_size, allocated_bytes) # A list with one element: the start address of the free block.
+            self.free_addresses_hash_table.insert(allocated_bytes, free_size)
+        self.largest_free_block: Optional[Tuple[int, int]] = (free_size, allocated_bytes) if free_size > 0 else None
+        # Occupancy counters maintained by _add_free_block and _remove_free_block for stats()
+        self.free_bytes = free_size
+        self.free_block_count = 1 if free_size > 0 else 0
+        # Segregated free lists for constant-time block search under TLSF
+        self.segregated_fit_index: Optional[SegregatedFitIndex] = None
+        if self.strategy == MemoryStrategy.TLSF:
+            self.segregated_fit_index = SegregatedFitIndex()
+            if free_size > 0:
+                self.segregated_fit_index.insert(allocated_bytes, free_size)
+
+    def _largest_free_block(self) -> Tuple[int, int]:
+        # The (size, start) of the largest free block. It is kept up to date by
+        # _add_free_block and only recomputed after that block itself is removed.
+        if self.largest_free_block is None:
+            block_size, start_address_list = self.free_sizes_hash_table.max_key()
+            if isinstance(start_address_list, list):
+                self.largest_free_block = block_size, start_address_list[0]
+            else:
+                self.largest_free_block = block_size, start_address_list
+        return self.largest_free_block
+
+    def _largest_free_size(self) -> int:
+        # Without a size table, the root of the address index's segment tree holds the largest size
+        if self.free_sizes_hash_table is None:
+            return self.free_addresses_hash_table.max_value()
+        return self._largest_free_block()[0]
+
+    def _add_free_block(self, start: int, size: int) -> None:
+        self.free_addresses_hash_table.insert(start, size)
+        if self.free_sizes_hash_table is not None:
+            self.free_sizes_hash_table.insert(size, start)
+        self.free_bytes += size
+        self.free_block_count += 1
+        if self.largest_free_block is not None and size > self.largest_free_block[0]:
+            self.largest_free_block = size, start
+        if self.segregated_fit_index is not None:
+            self.segregated_fit_index.insert(start, size)
+
+    def _remove_free_block(self, start: int, size: int) -> None:
+        if start == 0:
+            self.free_addresses_hash_table.insert(0, 0)  # Keep address 0 as a placeholder
+        else:
+            self.free_addresses_hash_table.delete(start)
+        if self.free_sizes_hash_table is not None:
+            self.free_sizes_hash_table.delete(size, start)
+        self.free_bytes -= size
+        self.free_block_count -= 1
+        if self.largest_free_block == (size, start):
+            self.largest_free_block = None
+        if self.segregated_fit_index is not None:
+            self.segregated_fit_index.delete(start, size)
 
     def _find_block(self, size: int) -> Tuple[int, int]:
         if self.strategy == MemoryStrategy.FIRST_FIT:
-            # Get the bitmap and the buckets from the hash table
-            buckets = self.free_addresses_hash_table.buckets
-            bitmap = self.free_addresses_hash_table.bitmap
-
-            # Find non-empty bucket
-            for index, bit in enumerate(bitmap):
-                if bit == 1:
-                    bucket = buckets[index]
-                    # Get all items from the occupied bucket
-                    second_level_items = bucket.items()
-                    for start_address, block_size in second_level_items:
-                        if block_size >= size:
-                            # Return the first fit
-                            return start_address, block_size
+            # Descend the max-augmented free-address index to the lowest block that fits
+            return self.free_addresses_hash_table.first_fit(size)
 
         elif self.strategy == MemoryStrategy.BEST_FIT:
             if self.free_sizes_hash_table.query(size) is not None:
@@ -60,15 +173,29 @@ class MemoryManager:
                 return start_address_list, block_size
 
         elif self.strategy == MemoryStrategy.WORST_FIT:
-            block_size, start_address_list = self.free_sizes_hash_table.max_key()
-            if isinstance(start_address_list, list):
-                return start_address_list[0], block_size
-            else:
-                return start_address_list, block_size
+            block_size, start_address = self._largest_free_block()
+            return start_address, block_size
+
+        elif self.strategy == MemoryStrategy.NEXT_FIT:
+            # Resume from the roving pointer, wrapping around to the start of the arena. A free
+            # block can straddle the pointer once a release merged it with the space before it,
+            # so that block is tried first.
+            block_start, block_size = self.free_addresses_hash_table.next_smaller_key(self.next_fit_cursor)
+            if block_start != -1 and block_start + block_size > self.next_fit_cursor and block_size >= size:
+                return block_start, block_size
+            start_address, block_size = self.free_addresses_hash_table.first_fit(size, self.next_fit_cursor)
+            if start_address == -1:
+                start_address, block_size = self.free_addresses_hash_table.first_fit(size)
+            return start_address, block_size
+
+        elif self.strategy == MemoryStrategy.TLSF:
+            # Bit-scan the segregated free lists for a list whose blocks all fit
+            return self.segregated_fit_index.find(size)
         return -1, -1
 
-    def _allocate(self, start: int, size: int) -> None:
-        # Allocate a block of memory and update the data structures
+    def _allocate(self, start: int, size: int, tagged: bool = False) -> None:
+        # Allocate a block of memory and update the data structures. A `tagged` block keeps its
+        # own allocated entry, which is how handle blocks stay addressable by their exact key.
         end = start + size
         previous_free_size = self.free_addresses_hash_table.query(start)
         if previous_free_size is None:
@@ -76,24 +203,20 @@ class MemoryManager:
         else: previous_free_start = start
         previous_free_end = previous_free_start + previous_free_size
         self.allocated_addresses_hash_table.insert(start, size)
-        a = True
+        self._remove_free_block(previous_free_start, previous_free_size)
         if start > previous_free_start:
-            leading_size = start - previous_free_start
-            self.free_addresses_hash_table.insert(previous_free_start, leading_size)
-            self.free_sizes_hash_table.insert(leading_size, previous_free_start)
-            a = False
+            self._add_free_block(previous_free_start, start - previous_free_start)  # Leading free block
         if previous_free_end > end:
-            trailing_size = previous_free_end - end
-            self.free_addresses_hash_table.insert(end, trailing_size)
-            self.free_sizes_hash_table.insert(trailing_size, end)
-        if a:
-            if previous_free_start == 0:
-                self.free_addresses_hash_table.insert(0, 0)
-            else: self.free_addresses_hash_table.delete(previous_free_start)
-        self.free_sizes_hash_table.delete(previous_free_size, previous_free_start)
-        self._merge_allocated_blocks(start, size)
+            self._add_free_block(end, previous_free_end - end)  # Trailing free block
+        if self.segregated_fit_index is None and not tagged:
+            self._merge_allocated_blocks(start, size)
+        # TLSF keeps one allocated entry per block, like a boundary tag, so neither the request nor
+        # the release of a block searches for the run around it. A release must then lie within
+        # one allocated block.
 
     def _deallocate(self, start: int, size: int) -> bool:
+        if size == 0:
+            return False  # Nothing to free, and a zero-sized free block must not enter the tables
         # Find the allocated block that contains the start address
         allocated_size = self.allocated_addresses_hash_table.query(start)
         if allocated_size is None:
@@ -108,6 +231,8 @@ class MemoryManager:
                 # Handle the error - requested deallocation exceeds the allocated block
                 return False
 
+            if self.handle_slots_by_start:
+                self._forget_released_handle(allocated_start, allocated_size, start, size)
             a = True
             if start > allocated_start:
                 leading_size = start - allocated_start
@@ -120,54 +245,25 @@ class MemoryManager:
                 if allocated_start == 0:
                     self.allocated_addresses_hash_table.insert(0, 0)
                 else: self.allocated_addresses_hash_table.delete(allocated_start)
-            self.free_addresses_hash_table.insert(start, size)
-            self.free_sizes_hash_table.insert(size, start)
             self._merge_free_blocks(start, size)
             return True
         return False
 
     def _merge_free_blocks(self, start: int, size: int) -> None:
+        # Add a freed block, coalesced with the free blocks on either side. The combined block
+        # is inserted once instead of inserting the freed block and removing it again.
         end = start + size
         previous_free_start, previous_free_size = self.free_addresses_hash_table.next_smaller_key(start)
         previous_free_end = previous_free_start + previous_free_size
         next_free_start, next_free_size = self.free_addresses_hash_table.next_larger_key(start)
         next_free_end = next_free_start + next_free_size
         if previous_free_end == start:
-            if end == next_free_start:
-                combined_size = next_free_end - previous_free_start
-                if previous_free_start == 0:
-                    self.free_addresses_hash_table.insert(0, 0)
-                else:
-                    self.free_addresses_hash_table.delete(previous_free_start)
-                self.free_sizes_hash_table.delete(previous_free_size, previous_free_start)
-                self.free_addresses_hash_table.delete(next_free_start)
-                self.free_sizes_hash_table.delete(next_free_size, next_free_start)
-                self.free_addresses_hash_table.delete(start)
-                self.free_sizes_hash_table.delete(size, start)
-                self.free_addresses_hash_table.insert(previous_free_start, combined_size)
-                self.free_sizes_hash_table.insert(combined_size, previous_free_start)
-            else:
-                combined_size = end - previous_free_start
-                if previous_free_start == 0:
-                    self.free_addresses_hash_table.insert(0, 0)
-                else:
-                    self.free_addresses_hash_table.delete(previous_free_start)
-                self.free_sizes_hash_table.delete(previous_free_size, previous_free_start)
-                self.free_addresses_hash_table.delete(start)
-                self.free_sizes_hash_table.delete(size, start)
-                self.free_addresses_hash_table.insert(previous_free_start, combined_size)
-                self.free_sizes_hash_table.insert(combined_size, previous_free_start)
-        elif end == next_free_start:
-            combined_size = next_free_end - start
-            self.free_addresses_hash_table.delete(next_free_start)
-            self.free_sizes_hash_table.delete(next_free_size, next_free_start)
-            if start == 0:
-                self.free_addresses_hash_table.insert(0, 0)
-            else:
-                self.free_addresses_hash_table.delete(start)
-            self.free_sizes_hash_table.delete(size, start)
-            self.free_addresses_hash_table.insert(start, combined_size)
-            self.free_sizes_hash_table.insert(combined_size, start)
+            self._remove_free_block(previous_free_start, previous_free_size)
+            start = previous_free_start
+        if end == next_free_start:
+            self._remove_free_block(next_free_start, next_free_size)
+            end = next_free_end
+        self._add_free_block(start, end - start)
 
 
     def _merge_allocated_blocks(self, start: int, size: int) -> None:
@@ -176,6 +272,11 @@ class MemoryManager:
         previous_allocated_end = previous_allocated_start + previous_allocated_size
         next_allocated_start, next_allocated_size = self.allocated_addresses_hash_table.next_larger_key(start)
         next_allocated_end = next_allocated_start + next_allocated_size
+        # Handle blocks keep their own entry, so they never join a run
+        if self._is_handle_block(previous_allocated_start, previous_allocated_size):
+            previous_allocated_end = -1
+        if self._is_handle_block(next_allocated_start, next_allocated_size):
+            next_allocated_start = -1
         if previous_allocated_end == start:
             if end == next_allocated_start:
                 combined_size = next_allocated_end - previous_allocated_start
@@ -200,101 +301,538 @@ class MemoryManager:
             else: self.allocated_addresses_hash_table.delete(start)
             self.allocated_addresses_hash_table.insert(start, combined_size)
 
+    def compact(self, max_bytes: Optional[int] = None) -> Dict[int, int]:
+        # Slide allocated blocks towards address 0 so the free memory becomes one block.
+        # Adjacent allocations without a handle share one entry in the allocated table, so
+        # memory moves in runs of back-to-back blocks; a handle block is a run of its own.
+        # Returns {old run start: new run start}; every address inside a run moves by the same
+        # offset. The caller copies the contents.
+        #
+        # Without `max_bytes` all runs move and the tables are rebuilt from one pass over the
+        # allocated table. With `max_bytes` the runs after the lowest free block move one by one,
+        # at most `max_bytes` units per call, so each call has a bounded pause and repeated calls
+        # finish the job. A merged run that does not fit in what is left of the budget is split
+        # and only its head moves. A handle block, or a TLSF block, is never split; one larger
+        # than `max_bytes` moves on its own in a call of its own. The runs moved by a call are
+        # consecutive, and the run where it stopped gets an entry mapping it to itself, so the
+        # greatest key at or below any address gives that address's new place.
+        assert max_bytes is None or max_bytes > 0, "The parameter `max_bytes` must be positive."
+        if self.buddy_allocator is not None:
+            raise ValueError("The buddy system cannot compact: blocks must stay aligned to their size.")
+        relocations = {}
+        moved_runs = []  # (old start, size, new start) in address order
+        if max_bytes is None:
+            allocated_bytes = 0
+            blocks = []  # The new allocated entries: runs merge unless a handle block or TLSF keeps them apart
+            previous_tagged = True
+            for start, size in self.allocated_addresses_hash_table.items():
+                if size == 0:
+                    continue  # The placeholder block at address 0
+                if start != allocated_bytes:
+                    relocations[start] = allocated_bytes
+                    moved_runs.append((start, size, allocated_bytes))
+                tagged = self.segregated_fit_index is not None or self._is_handle_block(start, size)
+                if tagged or previous_tagged:
+                    blocks.append((allocated_bytes, size))
+                else:
+                    blocks[-1] = blocks[-1][0], blocks[-1][1] + size
+                previous_tagged = tagged
+                allocated_bytes += size
+            if relocations:
+                self._build_tables(allocated_bytes)
+                if blocks:
+                    self.allocated_addresses_hash_table.build(blocks)
+                self.next_fit_cursor = allocated_bytes % self.total_memory
+            self._relocate_handles(moved_runs)
+            return relocations
+        moved_bytes = 0
+        while True:
+            free_start, free_size = self.free_addresses_hash_table.first_fit(1)
+            run_start = free_start + free_size
+            if free_start == -1 or run_start == self.total_memory:
+                break  # No free block, or only one at the end of memory
+            run_size = self.allocated_addresses_hash_table.query(run_start)
+            budget = max_bytes - moved_bytes
+            slot = self.handle_slots_by_start.get(run_start) if self._is_handle_block(run_start, run_size) else None
+            if slot is not None or self.segregated_fit_index is not None:
+                if moved_bytes > 0 and run_size > budget:
+                    relocations[run_start] = run_start  # A block moves whole, in a later call
+                    break
+                move_size = run_size
+            else:
+                if budget <= 0:
+                    relocations[run_start] = run_start  # Spent, or overrun by a block larger than `max_bytes`
+                    break
+                move_size = min(run_size, budget)
+            # Free the head of the run and place it again. A handle follows its block at once, so
+            # the runs placed after it see a handle block and do not merge into it.
+            self.allocated_addresses_hash_table.delete(run_start)
+            if move_size < run_size:
+                self.allocated_addresses_hash_table.insert(run_start + move_size, run_size - move_size)  # The tail stays
+            self._merge_free_blocks(run_start, move_size)
+            self._allocate(free_start, move_size, slot is not None)
+            if slot is not None:
+                self._move_handle(slot, free_start)
+            relocations[run_start] = free_start
+            moved_bytes += move_size
+        return relocations
+
+    def _relocate_handles(self, moved_runs: List[Tuple[int, int, int]]) -> None:
+        # Point the handles of moved blocks at their new addresses. A handle block is a run of
+        # its own, so only a run's start can hold a handle. (Young blocks of a collector's
+        # nursery sit inside one run, but the nursery is at address 0 and never moves.)
+        if not self.handle_slots_by_start:
+            return
+        # Runs move down in address order, so the new addresses never collide with unmoved handles
+        for old_start, size, new_start in moved_runs:
+            if self._is_handle_block(old_start, size):
+                self._move_handle(self.handle_slots_by_start[old_start], new_start)
+
+    def snapshot(self, path: str) -> None:
+        # Write the complete state as sorted int64 arrays, so restore() can bulk-build the
+        # tables instead of replaying the operation history. List orders that decide future
+        # choices (free blocks of equal size, TLSF and buddy free lists) are kept.
+        free_addresses = self.free_addresses_hash_table.items()
+        free_sizes = self.free_sizes_hash_table.items() if self.free_sizes_hash_table is not None else []
+        allocated_addresses = self.allocated_addresses_hash_table.items()
+        segregated_blocks = self.segregated_fit_index.blocks() if self.segregated_fit_index is not None else []
+        buddy_free_blocks = []
+        buddy_allocated_blocks = []
+        if self.buddy_allocator is not None:
+            buddy_free_blocks = [(order, start) for order, free_list in enumerate(self.buddy_allocator.free_lists)
+                                 for start in free_list]
+            buddy_allocated_blocks = [(start, order, requested_size) for start, (order, requested_size)
+                                      in self.buddy_allocator.allocated_blocks.items()]
+        with open(path, mode="wb") as output_file:
+            output_file.write(SNAPSHOT_MAGIC)
+            _write_array(output_file, [self.strategy.value, self.total_memory, self.first_level_bits,
+                                       self.backend.value, self.next_fit_cursor])
+            _write_array(output_file, [start for start, _ in free_addresses])
+            _write_array(output_file, [size for _, size in free_addresses])
+            _write_array(output_file, [size for size, _ in free_sizes])
+            _write_array(output_file, [len(starts) for _, starts in free_sizes])
+            _write_array(output_file, [start for _, starts in free_sizes for start in starts])
+            _write_array(output_file, [start for start, _ in allocated_addresses])
+            _write_array(output_file, [size for _, size in allocated_addresses])
+            _write_array(output_file, [start for start, _ in segregated_blocks])
+            _write_array(output_file, [size for _, size in segregated_blocks])
+            _write_array(output_file, [order for order, _ in buddy_free_blocks])
+            _write_array(output_file, [start for _, start in buddy_free_blocks])
+            _write_array(output_file, [start for start, _, _ in buddy_allocated_blocks])
+            _write_array(output_file, [order for _, order, _ in buddy_allocated_blocks])
+            _write_array(output_file, [requested_size for _, _, requested_size in buddy_allocated_blocks])
+            _write_array(output_file, self.handle_starts)
+            _write_array(output_file, self.handle_sizes)
+            _write_array(output_file, self.handle_generations)
+            _write_array(output_file, self.free_handle_slots)
+
+    @staticmethod
+    def restore(path: str) -> "MemoryManager":
+        # Rebuild a manager written by snapshot(). Every tree is built balanced from its sorted
+        # slice in linear time rather than by one insert per block.
+        with open(path, mode="rb") as input_file:
+            if input_file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a MemoryManager snapshot.")
+            strategy, total_memory, first_level_bits, backend, next_fit_cursor = _read_array(input_file)
+            free_address_starts, free_address_sizes = _read_array(input_file), _read_array(input_file)
+            free_sizes, free_size_counts, free_size_starts = _read_array(input_file), _read_array(input_file), _read_array(input_file)
+            allocated_starts, allocated_sizes = _read_array(input_file), _read_array(input_file)
+            segregated_starts, segregated_sizes = _read_array(input_file), _read_array(input_file)
+            buddy_free_orders, buddy_free_starts = _read_array(input_file), _read_array(input_file)
+            buddy_allocated_starts, buddy_allocated_orders, buddy_requested_sizes = \
+                _read_array(input_file), _read_array(input_file), _read_array(input_file)
+            handle_starts, handle_sizes, handle_generations, free_handle_slots = \
+                _read_array(input_file), _read_array(input_file), _read_array(input_file), _read_array(input_file)
+        memory_manager = MemoryManager(MemoryStrategy(strategy), total_memory, first_level_bits, TreeBackend(backend))
+        memory_manager.next_fit_cursor = next_fit_cursor
+        memory_manager.free_addresses_hash_table.build(list(zip(free_address_starts, free_address_sizes)))
+        free_size_lists = []
+        offset = 0
+        for count in free_size_counts:
+            free_size_lists.append(free_size_starts[offset:offset + count])
+            offset += count
+        if memory_manager.free_sizes_hash_table is not None:
+            memory_manager.free_sizes_hash_table.build(list(zip(free_sizes, free_size_lists)))
+        memory_manager.allocated_addresses_hash_table.build(list(zip(allocated_starts, allocated_sizes)))
+        memory_manager.largest_free_block = None  # Looked up on first use
+        memory_manager.free_bytes = sum(free_address_sizes)
+        memory_manager.free_block_count = sum(1 for size in free_address_sizes if size > 0)
+        if memory_manager.segregated_fit_index is not None:
+            memory_manager.segregated_fit_index = SegregatedFitIndex()
+            for start, size in zip(segregated_starts, segregated_sizes):
+                memory_manager.segregated_fit_index.insert(start, size)
+        buddy_allocator = memory_manager.buddy_allocator
+        if buddy_allocator is not None:
+            buddy_allocator.free_lists = [{} for _ in range(buddy_allocator.max_order + 1)]
+            buddy_allocator.order_bitmap = 0
+            for order, start in zip(buddy_free_orders, buddy_free_starts):
+                buddy_allocator._push(start, order)
+            buddy_allocator.allocated_blocks = {start: (order, requested_size) for start, order, requested_size
+                                                in zip(buddy_allocated_starts, buddy_allocated_orders, buddy_requested_sizes)}
+            buddy_allocator.allocated_bytes = sum(1 << order for order in buddy_allocated_orders)
+            buddy_allocator.requested_bytes = sum(buddy_requested_sizes)
+        memory_manager.handle_starts = array.array("q", handle_starts)
+        memory_manager.handle_sizes = array.array("q", handle_sizes)
+        memory_manager.handle_generations = array.array("q", handle_generations)
+        memory_manager.free_handle_slots = list(free_handle_slots)
+        memory_manager.handle_slots_by_start = {start: slot for slot, (start, size)
+                                                in enumerate(zip(handle_starts, handle_sizes)) if size != -1}
+        return memory_manager
+
     def request(self, op: MemoryOperation) -> int:
-        size = op.size
-        if op.addr is not None:
-            # If address is provided, check if it's available
-            if not self.is_valid_op(op):
-                return -1
-            self._allocate(op.addr, size)
-            #print(self.free_addresses_hash_table.items())
-            #print(self.free_sizes_hash_table.items())
-            #print(self.allocated_addresses_hash_table.items())
-            return op.addr
+        return self._request(op.size, op.addr)
+
+    def _request(self, size: int, addr: Optional[int], tagged: bool = False) -> int:
+        if not self._is_valid_request(size, addr):
+            start = -1
+        elif self.buddy_allocator is not None:
+            start = self.buddy_allocator.request(size, addr)
+        elif addr is not None:
+            # The address was checked to be available by _is_valid_request
+            self._allocate(addr, size, tagged)
+            start = addr
         else:
             # Find a block based on the strategy
-            if not self.is_valid_op(op):
-                return -1
             start, _ = self._find_block(size)
             if start != -1:
-                self._allocate(start, size)
-                #print(self.free_addresses_hash_table.items())
-                #print(self.free_sizes_hash_table.items())
-                #print(self.allocated_addresses_hash_table.items())
-                return start
-            return -1
+                self._allocate(start, size, tagged)
+                if self.strategy == MemoryStrategy.NEXT_FIT:
+                    self.next_fit_cursor = (start + size) % self.total_memory
+        if self.telemetry is not None:
+            self.telemetry.observe()
+        return start
 
     def release(self, op: MemoryOperation) -> bool:
-        if not self.is_valid_op(op):
+        return self._release(op.addr, op.size)
+
+    def _release(self, addr: int, size: int) -> bool:
+        if not self._is_valid_release(addr, size):
+            released = False
+        elif self.buddy_allocator is not None:
+            released = self.buddy_allocator.release(addr, size)
+            if released and addr in self.handle_slots_by_start:
+                self._retire_handle_slot(self.handle_slots_by_start[addr])  # The whole block was released
+        else:
+            released = self._deallocate(addr, size)  # Also shrinks or retires a handle of the block
+        if self.telemetry is not None:
+            self.telemetry.observe()
+        return released
+
+    def _is_handle_block(self, start: int, size: int) -> bool:
+        # Whether the allocated entry (start, size) is the block of a handle
+        slot = self.handle_slots_by_start.get(start)
+        return slot is not None and self.handle_sizes[slot] == size
+
+    def _forget_released_handle(self, block_start: int, block_size: int, start: int, size: int) -> None:
+        # Called by _deallocate before it releases [start, start + size) from the allocated
+        # entry (block_start, block_size). If that entry is a handle block, the handle is retired
+        # when the whole block goes, follows the tail when the head goes, and otherwise keeps
+        # the head: a tail left after a release in the middle has no handle and is only
+        # released by address. So a stale handle can never free memory that was reused.
+        if not self._is_handle_block(block_start, block_size):
+            return
+        slot = self.handle_slots_by_start[block_start]
+        end = start + size
+        block_end = block_start + block_size
+        if start == block_start and end == block_end:
+            self._retire_handle_slot(slot)
+        elif start == block_start:
+            self.handle_sizes[slot] = block_end - end
+            self._move_handle(slot, end)
+        else:
+            self.handle_sizes[slot] = start - block_start
+
+    def attach_telemetry(self, recorder) -> None:
+        # `recorder.observe()` is called after every request and release; None detaches it
+        self.telemetry = recorder
+
+    def request_many(self, sizes, addrs=None) -> "np.ndarray":
+        # Serve a batch of requests in order. `sizes` and `addrs` are NumPy arrays or sequences;
+        # a negative or None address means "no fixed address". Returns the start addresses,
+        # with -1 for requests that could not be served.
+        #
+        # Each run of consecutive requests without an address is carved out of one free block
+        # found for the run's total size: the blocks are laid back to back with a single table
+        # update. So the blocks of a run stay together where one-by-one requests could have
+        # filled smaller holes. A run that fits in no single block, and requests with an
+        # address, go through _request one by one. The buddy system always does.
+        import numpy as np
+        sizes = np.asarray(sizes, dtype=np.int64).tolist()
+        if addrs is None:
+            addrs = [None] * len(sizes)
+        else:
+            addrs = [None if addr is None or addr < 0 else addr for addr in np.asarray(addrs, dtype=object).tolist()]
+        starts = np.full(len(sizes), -1, dtype=np.int64)
+        index = 0
+        while index < len(sizes):
+            run_end = index
+            if self.buddy_allocator is None:
+                while run_end < len(sizes) and addrs[run_end] is None and 0 < sizes[run_end] <= self.total_memory:
+                    run_end += 1
+            if run_end - index > 1 and self._carve_run(sizes, index, run_end, starts):
+                index = run_end
+                continue
+            if run_end == index:
+                run_end += 1
+            for position in range(index, run_end):
+                starts[position] = self._request(sizes[position], addrs[position])
+            index = run_end
+        return starts
+
+    def _carve_run(self, sizes: List[int], run_start: int, run_end: int, starts: "np.ndarray") -> bool:
+        # Allocate sizes[run_start:run_end] back to back from one free block, if one fits them all
+        total = sum(sizes[run_start:run_end])
+        if self._largest_free_size() < total:
             return False
+        start, _ = self._find_block(total)
+        if start == -1:
+            return False
+        self._allocate(start, total)
+        if self.strategy == MemoryStrategy.NEXT_FIT:
+            self.next_fit_cursor = (start + total) % self.total_memory
+        for position in range(run_start, run_end):
+            starts[position] = start
+            start += sizes[position]
+            if self.telemetry is not None:
+                self.telemetry.observe()
+        return True
+
+    def release_many(self, addrs, sizes) -> "np.ndarray":
+        # Release a batch of address ranges. The ranges are sorted by address and runs of
+        # back-to-back ranges are released as one range, so each run is coalesced with its free
+        # neighbours once. Returns one success flag per range, in the caller's order.
+        import numpy as np
+        addrs = np.asarray(addrs, dtype=np.int64)
+        sizes = np.asarray(sizes, dtype=np.int64)
+        results = np.zeros(len(addrs), dtype=bool)
+        if self.buddy_allocator is not None:
+            # Buddy blocks must be released one by one
+            for index, (addr, size) in enumerate(zip(addrs.tolist(), sizes.tolist())):
+                results[index] = self._release(addr, size)
+            return results
+        order = np.argsort(addrs, kind="stable").tolist()
+        addrs = addrs.tolist()
+        sizes = sizes.tolist()
+        runs = []
+        for index in order:
+            if runs and sizes[index] > 0:
+                last = runs[-1][-1]
+                if sizes[last] > 0 and addrs[last] + sizes[last] == addrs[index]:
+                    runs[-1].append(index)
+                    continue
+            runs.append([index])
+        for run in runs:
+            if len(run) > 1:
+                run_start = addrs[run[0]]
+                if self._release(run_start, addrs[run[-1]] + sizes[run[-1]] - run_start):
+                    results[run] = True
+                    continue
+            # A single range, or a run that does not sit inside one allocated block
+            for index in run:
+                results[index] = self._release(addrs[index], sizes[index])
+        return results
+
+    def alloc(self, size: int) -> int:
+        # Allocate `size` units and return an opaque handle for the block, or -1
+        if size <= 0:
+            return -1  # Zero-sized blocks have no address of their own to identify them by
+        start = self._request(size, None, tagged=True)
+        if start == -1:
+            return -1
+        return self._new_handle(start, size)
+
+    def _new_handle(self, start: int, size: int) -> int:
+        # Give an allocated block a handle. Also used by the collectors for blocks they place themselves.
+        if self.free_handle_slots:
+            slot = self.free_handle_slots.pop()
+            self.handle_generations[slot] += 1
+            self.handle_starts[slot] = start
+            self.handle_sizes[slot] = size
+        else:
+            slot = len(self.handle_starts)
+            self.handle_generations.append(0)
+            self.handle_starts.append(start)
+            self.handle_sizes.append(size)
+        self.handle_slots_by_start[start] = slot
+        return (self.handle_generations[slot] << HANDLE_SLOT_BITS) | slot
+
+    def _handle_slot(self, handle: int) -> int:
+        # The slot of a live handle, or -1 for a stale or unknown one
+        slot = handle & ((1 << HANDLE_SLOT_BITS) - 1)
+        if handle < 0 or slot >= len(self.handle_starts) or self.handle_sizes[slot] == -1 \
+                or self.handle_generations[slot] != handle >> HANDLE_SLOT_BITS:
+            return -1
+        return slot
+
+    def _move_handle(self, slot: int, start: int) -> None:
+        del self.handle_slots_by_start[self.handle_starts[slot]]
+        self.handle_starts[slot] = start
+        self.handle_slots_by_start[start] = slot
+
+    def _retire_handle_slot(self, slot: int) -> None:
+        del self.handle_slots_by_start[self.handle_starts[slot]]
+        self.handle_sizes[slot] = -1
+        self.free_handle_slots.append(slot)
+
+    def address_of(self, handle: int) -> int:
+        # Start address of the block behind a live handle, or -1
+        slot = self._handle_slot(handle)
+        return self.handle_starts[slot] if slot != -1 else -1
+
+    def _place_handles(self, start: int, slots: List[int]) -> None:
+        # Move the blocks of `slots` back to back into the block at `start`, which was requested
+        # with tagged=True for their total size, and give each block its own allocated entry
+        for slot in slots:
+            size = self.handle_sizes[slot]
+            if self.buddy_allocator is None:
+                self.allocated_addresses_hash_table.insert(start, size)  # The first one shrinks the entry at `start`
+            self._move_handle(slot, start)
+            start += size
+
+    def free(self, handle: int) -> bool:
+        # Release the block behind a handle. The slot table gives its address and size, and a
+        # handle block is its own allocated entry, so it is removed by its exact key without
+        # searching for the allocation that holds it. Only coalescing looks up its free neighbours.
+        slot = self._handle_slot(handle)
+        if slot == -1 or not self._is_valid_release(self.handle_starts[slot], self.handle_sizes[slot]):
+            return False
+        self._free_handle_slots([slot])
+        return True
+
+    def free_many(self, handles) -> "np.ndarray":
+        # Release a batch of handles as free() does. Back-to-back blocks are coalesced with their
+        # free neighbours once per run, in address order. Returns one success flag per handle.
+        import numpy as np
+        results = np.zeros(len(handles), dtype=bool)
+        results[self._free_handles(handles)] = True
+        return results
+
+    def _free_handles(self, handles) -> List[int]:
+        # free_many without NumPy, for the collectors. Returns the indices of the freed handles.
+        slots = {}
+        for index, handle in enumerate(handles):
+            slot = self._handle_slot(handle)
+            if slot != -1 and slot not in slots and self._is_valid_release(self.handle_starts[slot], self.handle_sizes[slot]):
+                slots[slot] = index
+        self._free_handle_slots(sorted(slots, key=self.handle_starts.__getitem__))
+        return list(slots.values())
+
+    def _free_handle_slots(self, slots: List[int]) -> None:
+        # Free the blocks of live handle slots given in address order, and retire the slots
+        run_start = run_end = -1
+        for slot in slots:
+            start, size = self.handle_starts[slot], self.handle_sizes[slot]
+            self._retire_handle_slot(slot)
+            if self.buddy_allocator is not None:
+                self.buddy_allocator.release(start, size)
+                if self.telemetry is not None:
+                    self.telemetry.observe()
+                continue
+            if start == 0:
+                self.allocated_addresses_hash_table.insert(0, 0)  # Keep address 0 as a placeholder
+            else:
+                self.allocated_addresses_hash_table.delete(start)
+            if start != run_end:
+                if run_start != -1:
+                    self._end_free_run(run_start, run_end)
+                run_start = start
+            run_end = start + size
+        if run_start != -1:
+            self._end_free_run(run_start, run_end)
 
-        boolean = self._deallocate(op.addr, op.size)
-        #print(self.free_addresses_hash_table.items())
-        #print(self.free_sizes_hash_table.items())
-        #print(self.allocated_addresses_hash_table.items())
-        return boolean
+    def _end_free_run(self, start: int, end: int) -> None:
+        self._merge_free_blocks(start, end - start)
+        if self.telemetry is not None:
+            self.telemetry.observe()
 
     def is_valid_op(self, op: MemoryOperation) -> bool:
         if op.op_type == MemoryOperationType.REQUEST:
-            # If a specific address is requested, check if it falls within any of the free blocks
-            if op.size > self.total_memory or op.size < 0:
-                return False
-            if op.addr is not None:
-                if op.addr > self.total_memory or op.addr < 0:
-                    return False
-                previous_free_size = self.free_addresses_hash_table.query(op.addr)
-                if previous_free_size is None:
-                    previous_free_start, previous_free_size = self.free_addresses_hash_table.next_smaller_key(op.addr)
-                else: previous_free_start = op.addr
-                previous_free_end = previous_free_start + previous_free_size
-                if previous_free_start <= op.addr < previous_free_end:
-                    remaining_size = previous_free_end - op.addr
-                    if remaining_size >= op.size:
-                        return True
-                # If no free block satisfies the request, return False
-                return False
-            # If no specific address is requested, check if there is any free block that is large enough
-            else:
-                max_free_size, _ = self.free_sizes_hash_table.max_key()
-                if max_free_size >= op.size:
-                    return True
+            return self._is_valid_request(op.size, op.addr)
         elif op.op_type == MemoryOperationType.RELEASE:
-            if op.size > self.total_memory or op.size < 0 or op.addr > self.total_memory or op.addr < 0:
-                return False
-            # Whether the release is valid will be decided later in _deallocate
-            return True
+            return self._is_valid_release(op.addr, op.size)
 
         # If the operation type is neither REQUEST nor RELEASE, return False
         return False
 
+    def _is_valid_request(self, size: int, addr: Optional[int]) -> bool:
+        if size > self.total_memory or size <= 0:
+            return False  # A zero-sized block would land on a free block's start and clobber its entries
+        if self.buddy_allocator is not None:
+            # The buddy system decides availability itself, so only check the bounds
+            return addr is None or 0 <= addr < self.total_memory
+        if addr is not None:
+            # If a specific address is requested, check if it falls within any of the free blocks
+            if addr >= self.total_memory or addr < 0:
+                return False
+            previous_free_size = self.free_addresses_hash_table.query(addr)
+            if previous_free_size is None:
+                previous_free_start, previous_free_size = self.free_addresses_hash_table.next_smaller_key(addr)
+            else: previous_free_start = addr
+            previous_free_end = previous_free_start + previous_free_size
+            if previous_free_start <= addr < previous_free_end:
+                remaining_size = previous_free_end - addr
+                if remaining_size >= size:
+                    return True
+            # If no free block satisfies the request, return False
+            return False
+        # If no specific address is requested, check if there is any free block that is large enough
+        return self._largest_free_size() >= size
+
+    def _is_valid_release(self, addr: int, size: int) -> bool:
+        if size > self.total_memory or size < 0 or addr >= self.total_memory or addr < 0:
+            return False
+        if self.reserved_range is not None and addr < self.reserved_range[1] and addr + size > self.reserved_range[0]:
+            return False  # Owned by a collector, which frees its blocks without the tables
+        # Whether the release is valid will be decided later in _deallocate
+        return True
+
+    def internal_fragmentation(self) -> int:
+        # Allocated units beyond the requested sizes. Only the buddy system rounds sizes up.
+        if self.buddy_allocator is not None:
+            return self.buddy_allocator.internal_fragmentation()
+        return 0
+
+    def stats(self, buckets: bool = False) -> Dict[str, object]:
+        # A snapshot of the occupancy counters. Everything except `largest_free_block` is kept
+        # up to date on every insert and delete; the largest free block is cached and only looked
+        # up again after it was split or merged. Per-bucket entry counts cost O(buckets) and are
+        # only included when `buckets` is True.
+        if self.buddy_allocator is not None:
+            buddy_allocator = self.buddy_allocator
+            free_bytes = self.total_memory - buddy_allocator.allocated_bytes
+            free_block_count = sum(len(free_list) for free_list in buddy_allocator.free_lists)
+            largest_free_block = 1 << (buddy_allocator.order_bitmap.bit_length() - 1) if buddy_allocator.order_bitmap else 0
+        else:
+            free_bytes = self.free_bytes
+            free_block_count = self.free_block_count
+            largest_free_block = max(0, self._largest_free_size())
+        stats = {
+            "free_bytes": free_bytes,
+            "allocated_bytes": self.total_memory - free_bytes,
+            "internal_fragmentation": self.internal_fragmentation(),
+            "free_block_count": free_block_count,
+            "largest_free_block": largest_free_block,
+            # 0 when all free memory is one block, approaching 1 as it splinters into small blocks
+            "external_fragmentation": 1 - largest_free_block / free_bytes if free_bytes else 0.0,
+        }
+        if buckets and self.buddy_allocator is None:
+            stats["free_addresses_buckets"] = self.get_bucket_sizes_free_addresses()
+            stats["free_sizes_buckets"] = self.get_bucket_sizes_free_sizes()
+            stats["allocated_addresses_buckets"] = self.get_bucket_sizes_allocated_addresses()
+        return stats
+
+    @staticmethod
+    def _bucket_entry_counts(hash_table) -> List[int]:
+        return [bucket.node_count if bucket is not None else 0 for bucket in hash_table.buckets]
+
     def get_bucket_sizes_allocated_addresses(self) -> List[int]:
-        bucket_sizes = []
-        for bucket in self.allocated_addresses_hash_table.buckets:
-            if bucket is not None:
-                size = len(bucket.items())
-            else:
-                size = 0
-            bucket_sizes.append(size)
-        return bucket_sizes
+        return self._bucket_entry_counts(self.allocated_addresses_hash_table)
 
     def get_bucket_sizes_free_addresses(self) -> List[int]:
-        bucket_sizes = []
-        for bucket in self.free_addresses_hash_table.buckets:
-            if bucket is not None:
-                size = len(bucket.items())
-            else:
-                size = 0
-            bucket_sizes.append(size)
-
-        return bucket_sizes
+        return self._bucket_entry_counts(self.free_addresses_hash_table)
 
     def get_bucket_sizes_free_sizes(self) -> List[int]:
-        bucket_sizes = []
-        for bucket in self.free_sizes_hash_table.buckets:
-            if bucket is not None:
-                size = len(bucket.items())
-            else:
-                size = 0
-            bucket_sizes.append(size)
-        return bucket_sizes
-
+        # Empty under TLSF, which keeps no size table
+        if self.free_sizes_hash_table is None:
+            return []
+        return self._bucket_entry_counts(self.free_sizes_hash_table)
@@ -7,6 +7,8 @@ class MemoryOperationType(enum.Enum):
 
 
 class MemoryOperation:
+    __slots__ = ("addr", "size", "op_type", "starting_at")
+
     def __init__(self, op_type: MemoryOperationType, addr: int = None, size: int = None, starting_at: int = None):
         if op_type == MemoryOperationType.REQUEST:
             assert size is not None, "The parameter `size` must be given in a REQUEST operation."
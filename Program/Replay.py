@@ -0,0 +1,71 @@
+from MemoryManager import MemoryManager, MemoryStrategy
+from Trace import TRACE_MAGIC, convert_csv_to_binary, replay_binary_trace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+import argparse
+import itertools
+import os
+import tempfile
+import time
+
+
+def replay_run(binary_path: str, strategy: MemoryStrategy, arena_size: int) -> Dict[str, object]:
+    # Runs in a worker process. The trace is memory-mapped by replay_binary_trace, so every
+    # worker shares the operating system's page cache instead of receiving a pickled copy.
+    memory_manager = MemoryManager(strategy, total_memory=arena_size)
+    start_time = time.perf_counter()
+    operations, failures, mismatches = replay_binary_trace(memory_manager, binary_path)
+    return {"operations": operations, "failures": failures, "mismatches": mismatches,
+            "seconds": time.perf_counter() - start_time}
+
+
+def is_binary_trace(path: str) -> bool:
+    with open(path, mode="rb") as input_file:
+        return input_file.read(len(TRACE_MAGIC)) == TRACE_MAGIC
+
+
+def replay_all(trace_paths: List[str], strategies: List[MemoryStrategy], arena_sizes: List[int],
+               workers: int = None) -> List[Dict[str, object]]:
+    # Replay every (trace, strategy, arena size) combination over a process pool with
+    # `workers` processes (default: one per core). CSV traces are converted once up front.
+    with tempfile.TemporaryDirectory() as binary_directory:
+        binary_paths = {}
+        for index, trace_path in enumerate(trace_paths):
+            if is_binary_trace(trace_path):
+                binary_paths[trace_path] = trace_path
+            else:
+                binary_path = os.path.join(binary_directory, f"{index}.bin")
+                convert_csv_to_binary(trace_path, binary_path)
+                binary_paths[trace_path] = binary_path
+        results = []
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            runs = {executor.submit(replay_run, binary_paths[trace_path], strategy, arena_size):
+                    {"trace": os.path.basename(trace_path), "strategy": strategy.name, "arena_size": arena_size}
+                    for trace_path, strategy, arena_size in itertools.product(trace_paths, strategies, arena_sizes)}
+            for run in as_completed(runs):
+                result = dict(runs[run])
+                result.update(run.result())
+                results.append(result)
+    results.sort(key=lambda result: (result["trace"], result["arena_size"], MemoryStrategy[result["strategy"]].value))
+    return results
+
+
+def print_comparison_table(results: List[Dict[str, object]]) -> None:
+    print(f"{'trace':>36} {'strategy':>10} {'arena':>12} {'ops':>9} {'seconds':>9} {'ops/sec':>10} "
+          f"{'failures':>9} {'mismatches':>11}")
+    for result in results:
+        ops_per_second = result["operations"] / result["seconds"] if result["seconds"] > 0 else 0.0
+        print(f"{result['trace']:>36} {result['strategy']:>10} {result['arena_size']:>12} {result['operations']:>9} "
+              f"{result['seconds']:>9.3f} {ops_per_second:>10.0f} {result['failures']:>9} {result['mismatches']:>11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay traces with every strategy in parallel and compare them.")
+    parser.add_argument("traces", nargs="+", help="CSV traces or binary traces written by Trace.py")
+    parser.add_argument("--strategies", nargs="+", default=[strategy.name for strategy in MemoryStrategy],
+                        choices=[strategy.name for strategy in MemoryStrategy])
+    parser.add_argument("--arena-sizes", nargs="+", type=int, default=[1024])
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    arguments = parser.parse_args()
+    print_comparison_table(replay_all(arguments.traces, [MemoryStrategy[name] for name in arguments.strategies],
+                                      arguments.arena_sizes, arguments.workers))
@@ -0,0 +1,101 @@
+import enum
+import itertools
+import threading
+from typing import Dict, List, Optional
+from MemoryManager import MemoryManager, MemoryStrategy
+from MemoryOperation import MemoryOperation
+
+
+class ShardingPolicy(enum.Enum):
+    THREAD = 0  # Each thread sticks to one home arena, assigned round-robin on first use
+    SIZE_CLASS = 1  # Requests of similar size share a home arena
+
+
+class ShardedMemoryManager:
+    # Splits the address space into independent arenas, each a MemoryManager with its own
+    # hash tables and its own lock, so threads working in different arenas never wait for
+    # each other. A request goes to its home arena first and falls back to the others when
+    # that arena cannot serve it; a release goes to the arena whose address range holds it.
+    # Blocks never span two arenas.
+
+    def __init__(self, strategy: MemoryStrategy, total_memory: int = 1024, arenas: int = 4,
+                 policy: ShardingPolicy = ShardingPolicy.THREAD, max_request_size: Optional[int] = None,
+                 **manager_options) -> None:
+        # `max_request_size` is the largest size the workload requests; SIZE_CLASS spreads the
+        # size classes up to it over the arenas (default: the arena size). `manager_options`
+        # are passed on to every arena's MemoryManager.
+        assert arenas > 0, "The parameter `arenas` must be positive."
+        assert total_memory // arenas > 1, "Every arena must hold at least 2 units."
+        assert max_request_size is None or max_request_size > 0, "The parameter `max_request_size` must be positive."
+        self.strategy = strategy
+        self.total_memory = total_memory
+        self.policy = policy
+        self.arena_size = total_memory // arenas
+        self.max_request_size = max_request_size if max_request_size is not None else self.arena_size
+        self.size_classes = self.max_request_size.bit_length()  # Sizes 1..max_request_size have bit lengths 1..size_classes
+        # Arena i covers [i * arena_size, (i + 1) * arena_size); the last one also takes the remainder
+        self.bases = [index * self.arena_size for index in range(arenas)]
+        arena_sizes = [self.arena_size] * (arenas - 1) + [total_memory - self.bases[-1]]
+        self.managers = [MemoryManager(strategy, arena_size, **manager_options) for arena_size in arena_sizes]
+        self.locks = [threading.Lock() for _ in range(arenas)]
+        self._thread_arena = threading.local()
+        self._next_thread_arena = itertools.count()
+
+    def _home_arena(self, size: int) -> int:
+        arenas = len(self.managers)
+        if self.policy == ShardingPolicy.SIZE_CLASS:
+            # Power-of-two size classes spread evenly over the arenas; larger sizes share the last one
+            size_class = min(size.bit_length(), self.size_classes) - 1
+            return size_class * arenas // self.size_classes
+        index = getattr(self._thread_arena, "index", None)
+        if index is None:
+            index = self._thread_arena.index = next(self._next_thread_arena) % arenas
+        return index
+
+    def _arena_of(self, addr: int) -> int:
+        return min(addr // self.arena_size, len(self.managers) - 1)
+
+    def request(self, op: MemoryOperation) -> int:
+        return self._request(op.size, op.addr)
+
+    def _request(self, size: int, addr: Optional[int]) -> int:
+        if addr is not None:
+            if addr >= self.total_memory or addr < 0:
+                return -1
+            index = self._arena_of(addr)
+            with self.locks[index]:
+                start = self.managers[index]._request(size, addr - self.bases[index])
+            return start if start == -1 else self.bases[index] + start
+        home = self._home_arena(size)
+        arenas = len(self.managers)
+        for offset in range(arenas):
+            index = (home + offset) % arenas
+            with self.locks[index]:
+                start = self.managers[index]._request(size, None)
+            if start != -1:
+                return self.bases[index] + start
+        return -1
+
+    def release(self, op: MemoryOperation) -> bool:
+        return self._release(op.addr, op.size)
+
+    def _release(self, addr: int, size: int) -> bool:
+        if addr >= self.total_memory or addr < 0:
+            return False
+        index = self._arena_of(addr)
+        with self.locks[index]:
+            return self.managers[index]._release(addr - self.bases[index], size)
+
+    def stats(self) -> Dict[str, object]:
+        # The arenas' stats() combined. Each arena is read under its own lock, one after the
+        # other, so under concurrent use the totals mix snapshots taken at different times and
+        # are not an atomic view of the whole address space.
+        arena_stats: List[Dict[str, object]] = []
+        for manager, lock in zip(self.managers, self.locks):
+            with lock:
+                arena_stats.append(manager.stats())
+        stats = {name: sum(stats[name] for stats in arena_stats)
+                 for name in ["free_bytes", "allocated_bytes", "internal_fragmentation", "free_block_count"]}
+        stats["largest_free_block"] = max(stats["largest_free_block"] for stats in arena_stats)
+        stats["external_fragmentation"] = 1 - stats["largest_free_block"] / stats["free_bytes"] if stats["free_bytes"] else 0.0
+        return stats
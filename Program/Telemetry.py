@@ -0,0 +1,78 @@
+from typing import Dict
+import numpy as np
+
+# Series recorded once per sample, in the order of MemoryManager.stats()
+SCALAR_SERIES = ["free_bytes", "allocated_bytes", "internal_fragmentation", "free_block_count",
+                 "largest_free_block", "external_fragmentation"]
+BUCKET_SERIES = ["free_addresses_buckets", "free_sizes_buckets", "allocated_addresses_buckets"]
+
+
+class TelemetryRecorder:
+    # Samples the occupancy of a MemoryManager every `interval` operations into preallocated
+    # ring buffers holding the latest `capacity` samples. Recording never allocates, and the
+    # per-bucket counts are only read when a sample is taken, so the cost per operation is a
+    # counter increment. Attach it with MemoryManager.attach_telemetry and plot the exported
+    # file offline.
+
+    def __init__(self, memory_manager, interval: int = 64, capacity: int = 4096, buckets: bool = True):
+        assert interval > 0, "The parameter `interval` must be positive."
+        assert capacity > 0, "The parameter `capacity` must be positive."
+        self.memory_manager = memory_manager
+        self.interval = interval
+        self.capacity = capacity
+        self.operations = 0
+        self.samples = 0
+        self.operation_index = np.zeros(capacity, dtype=np.int64)
+        self.scalars = {name: np.zeros(capacity, dtype=np.float64 if name == "external_fragmentation" else np.int64)
+                        for name in SCALAR_SERIES}
+        # The buddy system has no hash-table buckets to record
+        self.buckets: Dict[str, np.ndarray] = {}
+        if buckets and memory_manager.buddy_allocator is None:
+            self.buckets = {
+                "free_addresses_buckets": np.zeros((capacity, memory_manager.free_addresses_hash_table.capacity), dtype=np.int32),
+                "allocated_addresses_buckets": np.zeros((capacity, memory_manager.allocated_addresses_hash_table.capacity), dtype=np.int32),
+            }
+            if memory_manager.free_sizes_hash_table is not None:  # TLSF keeps no size table
+                self.buckets["free_sizes_buckets"] = np.zeros((capacity, memory_manager.free_sizes_hash_table.capacity), dtype=np.int32)
+
+    def observe(self) -> None:
+        # Called by the MemoryManager after every request and release
+        self.operations += 1
+        if self.operations % self.interval == 0:
+            self.sample()
+
+    def sample(self) -> None:
+        row = self.samples % self.capacity
+        self.operation_index[row] = self.operations
+        stats = self.memory_manager.stats()
+        for name, series in self.scalars.items():
+            series[row] = stats[name]
+        if self.buckets:
+            self.buckets["free_addresses_buckets"][row] = self.memory_manager.get_bucket_sizes_free_addresses()
+            if "free_sizes_buckets" in self.buckets:
+                self.buckets["free_sizes_buckets"][row] = self.memory_manager.get_bucket_sizes_free_sizes()
+            self.buckets["allocated_addresses_buckets"][row] = self.memory_manager.get_bucket_sizes_allocated_addresses()
+        self.samples += 1
+
+    def _chronological(self, series: np.ndarray) -> np.ndarray:
+        # Unroll the ring buffer so the oldest retained sample comes first
+        if self.samples <= self.capacity:
+            return series[:self.samples]
+        return np.roll(series, -(self.samples % self.capacity), axis=0)
+
+    def series(self) -> Dict[str, np.ndarray]:
+        recorded = {"operation": self._chronological(self.operation_index)}
+        for name, series in self.scalars.items():
+            recorded[name] = self._chronological(series)
+        for name, series in self.buckets.items():
+            recorded[name] = self._chronological(series)
+        return recorded
+
+    def export(self, path: str) -> None:
+        # Compressed .npz with one array per series; bucket series are (samples, buckets)
+        np.savez_compressed(path, interval=self.interval, **self.series())
+
+
+def load_telemetry(path: str) -> Dict[str, np.ndarray]:
+    with np.load(path) as telemetry:
+        return {name: telemetry[name] for name in telemetry.files}
@@ -1,83 +1,105 @@
 from MemoryManager import MemoryManager, MemoryStrategy
 from MemoryOperation import MemoryOperation, MemoryOperationType
-import matplotlib.pyplot as plt
-import numpy as np
+from Trace import stream_csv_trace
 import time
 
-def read_operations_from_file(file_path):
-    input_file = open(file_path, mode='r')
-    memory_operations = []
-    for line in input_file.readlines():
-        line = line.strip()
-        if line == "":
-            continue
-        str_op = line.replace("\n", "").replace("\r", "").replace(" ", "").split(",")
-        op_type_int = int(str_op[0])
-        size = None if str_op[1] == "" else int(str_op[1])
-        addr = None if str_op[2] == "" else int(str_op[2])
-        memory_operations.append({
+def stream_operations_from_file(file_path):
+    # Yield one operation at a time instead of loading the whole file
+    for op_type_int, size, addr, expected in stream_csv_trace(file_path):
+        yield {
             "op": MemoryOperation(
                 op_type=MemoryOperationType.REQUEST if op_type_int == 1 else MemoryOperationType.RELEASE,
                 addr=addr, size=size),
-            })
-    input_file.close()
-    return memory_operations
+            "expected": expected,
+            }
+
+
+def read_operations_from_file(file_path):
+    return list(stream_operations_from_file(file_path))
 
 
 class TestContext:
     def __init__(self, memory_manager):
         self.memory_manager = memory_manager
 
-    def basic_test_on(self, test_file_path):
+    def basic_test_on(self, test_file_path, telemetry_path=None, telemetry_interval=64):
+        # With `telemetry_path`, bucket occupancy and fragmentation are sampled every
+        # `telemetry_interval` operations and saved there for plot_telemetry
+        recorder = None
+        if telemetry_path is not None:
+            from Telemetry import TelemetryRecorder
+            recorder = TelemetryRecorder(self.memory_manager, interval=telemetry_interval)
+            self.memory_manager.attach_telemetry(recorder)
         start_time = time.time()
-        test_cases = read_operations_from_file(test_file_path)
+        test_cases = stream_operations_from_file(test_file_path)
         print(f"Start test on {test_file_path}.")
-        all_bucket_sizes = [[], [], []]
         for test_case in test_cases:
             if test_case["op"].op_type == MemoryOperationType.REQUEST:
                 self.memory_manager.request(test_case["op"])
-                #all_bucket_sizes[0].append(self.memory_manager.get_bucket_sizes_free_addresses())
-                #all_bucket_sizes[1].append(self.memory_manager.get_bucket_sizes_free_sizes())
-                #all_bucket_sizes[2].append(self.memory_manager.get_bucket_sizes_allocated_addresses())
             elif test_case["op"].op_type == MemoryOperationType.RELEASE:
                 self.memory_manager.release(test_case["op"])
-                #all_bucket_sizes[0].append(self.memory_manager.get_bucket_sizes_free_addresses())
-                #all_bucket_sizes[1].append(self.memory_manager.get_bucket_sizes_free_sizes())
-                #all_bucket_sizes[2].append(self.memory_manager.get_bucket_sizes_allocated_addresses())
         end_time = time.time()
         print(end_time - start_time)
-        #print(np.sum(all_bucket_sizes[0][-1]))
-        #print(np.sum(all_bucket_sizes[1][-1]))
-        #print(np.sum(all_bucket_sizes[2][-1]))
-        print('a')
-        # Prepare the data for the surface plot
-        for i in range(3):
-            X = np.arange(len(all_bucket_sizes[i][0]))  # Bucket indices
-            Y = np.arange(len(all_bucket_sizes[i]))  # Operation numbers
-            X, Y = np.meshgrid(X, Y)  # Create the 2D grid for X and Y
-            Z = np.array(all_bucket_sizes[i])  # Convert the bucket sizes into a NumPy array for Z values
+        if recorder is not None:
+            self.memory_manager.attach_telemetry(None)
+            recorder.export(telemetry_path)
+            print(f"Telemetry saved to {telemetry_path}.")
+        print(f"All test passed for {test_file_path}.")
 
-            # Plotting the 3D surface
-            fig = plt.figure()
-            ax = fig.add_subplot(111, projection='3d')
 
-            # Create the surface plot
-            surf = ax.plot_surface(X, Y, Z, cmap='viridis', edgecolor='none')
+def plot_telemetry(telemetry_path):
+    # Offline plotting of a file written by TelemetryRecorder.export, so replay is never slowed down
+    import matplotlib.pyplot as plt
+    import numpy as np
+    from Telemetry import load_telemetry, BUCKET_SERIES
+    telemetry = load_telemetry(telemetry_path)
+    for name in BUCKET_SERIES:
+        if name not in telemetry or len(telemetry[name]) == 0:
+            continue
+        X = np.arange(telemetry[name].shape[1])  # Bucket indices
+        Y = telemetry["operation"]  # Operation numbers of the samples
+        X, Y = np.meshgrid(X, Y)  # Create the 2D grid for X and Y
 
-            # Add a color bar to show the bucket size scale
-            fig.colorbar(surf, shrink=0.5, aspect=5)
+        # Plotting the 3D surface
+        fig = plt.figure()
+        ax = fig.add_subplot(111, projection='3d')
+        surf = ax.plot_surface(X, Y, telemetry[name], cmap='viridis', edgecolor='none')
 
-            # Labels
-            ax.set_xlabel('Bucket Index')
-            ax.set_ylabel('Operation Number')
-            ax.set_zlabel('Bucket Size')
+        # Add a color bar to show the bucket size scale
+        fig.colorbar(surf, shrink=0.5, aspect=5)
+        ax.set_title(name)
+        ax.set_xlabel('Bucket Index')
+        ax.set_ylabel('Operation Number')
+        ax.set_zlabel('Bucket Size')
 
-            # Show plot
-            plt.show()
-        print(f"All test passed for {test_file_path}.")
+    fig, ax = plt.subplots()
+    ax.plot(telemetry["operation"], telemetry["external_fragmentation"])
+    ax.set_xlabel('Operation Number')
+    ax.set_ylabel('External Fragmentation')
+    plt.show()
+
+
+def stale_handle_test(strategy):
+    # Regression test: releasing the tail of a handle's block by address shrinks the handle, so
+    # freeing the handle later leaves alone a block allocated in the released space
+    memory_manager = MemoryManager(strategy=strategy)
+    handle = memory_manager.alloc(10)
+    start = memory_manager.address_of(handle)
+    assert memory_manager.release(MemoryOperation(op_type=MemoryOperationType.RELEASE, addr=start + 5, size=5))
+    other_handle = memory_manager.alloc(5)
+    assert memory_manager.address_of(other_handle) == start + 5
+    assert memory_manager.free(handle)
+    assert not memory_manager.free(handle)
+    assert memory_manager.address_of(other_handle) == start + 5
+    assert memory_manager.allocated_addresses_hash_table.query(start + 5) == 5
+    assert memory_manager.free(other_handle)
+    assert memory_manager.stats()["free_bytes"] == memory_manager.total_memory
+    print(f"Stale handle test passed for {strategy.name}.")
 
 
 if __name__ == "__main__":
+    for strategy in [MemoryStrategy.FIRST_FIT, MemoryStrategy.BEST_FIT]:
+        stale_handle_test(strategy)
     # This test code is only for you to debug the basic implementation of MemoryManager.
     # Please note that these are not final test cases for assessment.
     memory_manager_to_test = MemoryManager(strategy=MemoryStrategy.WORST_FIT)
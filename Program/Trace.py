@@ -0,0 +1,93 @@
+from typing import TYPE_CHECKING, Iterator, Optional, Tuple
+if TYPE_CHECKING:
+    import numpy as np  # Only the binary format needs NumPy, so it is imported where it is used
+
+# One fixed-width record per operation: op type (1 = REQUEST, 0 = RELEASE), size, address and
+# expected address, packed without padding. Missing values are stored as MISSING, since an
+# expected address of -1 is meaningful (the request must fail).
+TRACE_FIELDS = [("op_type", "<i1"), ("size", "<i8"), ("addr", "<i8"), ("expected", "<i8")]
+TRACE_MAGIC = b"GCTRACE1"
+MISSING = -2 ** 63
+
+TraceRecord = Tuple[int, Optional[int], Optional[int], Optional[int]]
+
+
+def parse_csv_line(line: str) -> Optional[TraceRecord]:
+    # `OperationType, Size, Address, ExpectedAddress` with empty fields for missing values
+    str_op = line.strip().replace(" ", "").split(",")
+    if str_op == [""]:
+        return None
+    str_op += [""] * (4 - len(str_op))
+    op_type_int = int(str_op[0])
+    size = None if str_op[1] == "" else int(str_op[1])
+    addr = None if str_op[2] == "" else int(str_op[2])
+    expected = None if str_op[3] == "" else int(str_op[3])
+    return op_type_int, size, addr, expected
+
+
+def stream_csv_trace(file_path: str) -> Iterator[TraceRecord]:
+    # Yield one record at a time so traces larger than RAM can be replayed
+    with open(file_path, mode="r") as input_file:
+        for line in input_file:
+            record = parse_csv_line(line)
+            if record is not None:
+                yield record
+
+
+def convert_csv_to_binary(csv_path: str, binary_path: str, chunk_records: int = 65536) -> int:
+    # Stream a CSV trace into the binary format chunk by chunk. Returns the record count.
+    import numpy as np
+    chunk = np.empty(chunk_records, dtype=np.dtype(TRACE_FIELDS))
+    count = filled = 0
+    with open(binary_path, mode="wb") as output_file:
+        output_file.write(TRACE_MAGIC)
+        for op_type_int, size, addr, expected in stream_csv_trace(csv_path):
+            chunk[filled] = (op_type_int,
+                             MISSING if size is None else size,
+                             MISSING if addr is None else addr,
+                             MISSING if expected is None else expected)
+            filled += 1
+            if filled == chunk_records:
+                output_file.write(chunk.tobytes())
+                count += filled
+                filled = 0
+        output_file.write(chunk[:filled].tobytes())
+        count += filled
+    return count
+
+
+def open_binary_trace(binary_path: str) -> "np.memmap":
+    # Memory-map a binary trace; records are paged in lazily by the operating system
+    with open(binary_path, mode="rb") as input_file:
+        if input_file.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{binary_path} is not a binary trace file.")
+    import numpy as np
+    return np.memmap(binary_path, dtype=np.dtype(TRACE_FIELDS), mode="r", offset=len(TRACE_MAGIC))
+
+
+def replay_binary_trace(memory_manager, binary_path: str, chunk_records: int = 65536) -> Tuple[int, int, int]:
+    # Replay a binary trace without building an operation object per record.
+    # Returns (operations, failed operations, requests whose address differs from the expected one).
+    records = open_binary_trace(binary_path)
+    failures = mismatches = 0
+    for chunk_start in range(0, len(records), chunk_records):
+        chunk = records[chunk_start:chunk_start + chunk_records]
+        for op_type_int, size, addr, expected in zip(chunk["op_type"].tolist(), chunk["size"].tolist(),
+                                                     chunk["addr"].tolist(), chunk["expected"].tolist()):
+            if op_type_int == 1:
+                result = memory_manager._request(size, None if addr == MISSING else addr)
+                if result == -1:
+                    failures += 1
+                if expected != MISSING and result != expected:
+                    mismatches += 1
+            elif not memory_manager._release(addr, size):
+                failures += 1
+    return len(records), failures, mismatches
+
+
+if __name__ == "__main__":
+    # Convert CSV traces to the binary format: python Trace.py ../Data/FIRST_FIT.csv [more.csv ...]
+    import sys
+    for csv_path in sys.argv[1:]:
+        binary_path = csv_path.rsplit(".", 1)[0] + ".bin"
+        print(f"{csv_path} -> {binary_path}: {convert_csv_to_binary(csv_path, binary_path)} records")
@@ -0,0 +1,92 @@
+import enum
+import random
+from typing import Callable, Iterator, List, Tuple
+
+# A workload is a stream of operations that does not depend on the strategy under test:
+#   (1, size, addr)  request `size` units, at `addr` if it is not None
+#   (0, request_id)  release the block returned by the request_id-th request (0-based)
+# A runner maps request ids to the addresses its MemoryManager returned and skips releases
+# of requests that failed.
+WorkloadOperation = Tuple
+SizeSampler = Callable[[], int]
+
+
+class FreeOrder(enum.Enum):
+    LIFO = 0
+    FIFO = 1
+    RANDOM = 2
+
+
+def uniform_sizes(rng: random.Random, low: int, high: int) -> SizeSampler:
+    return lambda: rng.randint(low, high)
+
+
+def power_law_sizes(rng: random.Random, low: int, high: int, alpha: float = 2.0) -> SizeSampler:
+    # Pareto-distributed sizes: mostly small blocks with a heavy tail, clipped to `high`
+    return lambda: min(high, int(low * rng.paretovariate(alpha - 1)))
+
+
+def _pop_live(live: List[int], free_order: FreeOrder, rng: random.Random) -> int:
+    if free_order == FreeOrder.LIFO:
+        return live.pop()
+    if free_order == FreeOrder.FIFO:
+        return live.pop(0)
+    index = rng.randrange(len(live))
+    live[index], live[-1] = live[-1], live[index]
+    return live.pop()
+
+
+def phased_workload(blocks: int, size_sampler: SizeSampler, free_order: FreeOrder,
+                    rng: random.Random) -> Iterator[WorkloadOperation]:
+    # Allocate `blocks` blocks, then release all of them in the given order
+    for _ in range(blocks):
+        yield 1, size_sampler(), None
+    live = list(range(blocks))
+    while live:
+        yield 0, _pop_live(live, free_order, rng)
+
+
+def fixed_address_workload(blocks: int, arena_size: int, size_sampler: SizeSampler,
+                           rng: random.Random) -> Iterator[WorkloadOperation]:
+    # Requests at random fixed addresses, some of which collide with live blocks
+    for _ in range(blocks):
+        size = size_sampler()
+        yield 1, size, rng.randrange(max(1, arena_size - size))
+    live = list(range(blocks))
+    while live:
+        yield 0, _pop_live(live, FreeOrder.RANDOM, rng)
+
+
+def steady_state_churn(live_blocks: int, operations: int, size_sampler: SizeSampler, free_order: FreeOrder,
+                       rng: random.Random) -> Iterator[WorkloadOperation]:
+    # Ramp up to `live_blocks` live blocks, then replace one block per step for a long run
+    request_id = 0
+    live = []
+    for _ in range(live_blocks):
+        yield 1, size_sampler(), None
+        live.append(request_id)
+        request_id += 1
+    for _ in range(operations):
+        yield 0, _pop_live(live, free_order, rng)
+        yield 1, size_sampler(), None
+        live.append(request_id)
+        request_id += 1
+
+
+def standard_workloads(arena_size: int, seed: int = 0,
+                       scale: int = 2000) -> List[Tuple[str, Callable[[], Iterator[WorkloadOperation]]]]:
+    # The named workloads of the benchmark suite, sized relative to the arena
+    max_size = max(2, arena_size // (4 * scale))
+
+    def make(factory: Callable[[random.Random], Iterator[WorkloadOperation]]):
+        return lambda: factory(random.Random(seed))
+
+    return [
+        ("uniform_lifo", make(lambda rng: phased_workload(scale, uniform_sizes(rng, 1, max_size), FreeOrder.LIFO, rng))),
+        ("uniform_fifo", make(lambda rng: phased_workload(scale, uniform_sizes(rng, 1, max_size), FreeOrder.FIFO, rng))),
+        ("uniform_random", make(lambda rng: phased_workload(scale, uniform_sizes(rng, 1, max_size), FreeOrder.RANDOM, rng))),
+        ("power_law_random", make(lambda rng: phased_workload(scale, power_law_sizes(rng, 1, max_size), FreeOrder.RANDOM, rng))),
+        ("fixed_address", make(lambda rng: fixed_address_workload(scale, arena_size, uniform_sizes(rng, 1, max_size), rng))),
+        ("steady_state_churn", make(lambda rng: steady_state_churn(scale, 5 * scale, power_law_sizes(rng, 1, max_size),
+                                                                   FreeOrder.RANDOM, rng))),
+    ]